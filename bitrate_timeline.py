@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Bitrate and frame-size timeline from the MP4 sample tables
+Uses the sample sizes (stsz) and decode times (stts) located by
+iframe_offset_extract.py to compute per-interval bitrate, the peak
+sliding-window bitrate within each interval and overall, and per-GOP sizes
+for every track, without decoding the media
+"""
+
+import csv
+import json
+import math
+import os
+import sys
+import argparse
+from bisect import bisect_left
+from itertools import accumulate
+
+from iframe_offset_extract import decode_times, extract_track_tables, parse_stsz, parse_stts, parse_stss
+
+
+def interval_bounds(times, timescale, interval):
+    """Index of the first sample of each interval of `interval` seconds, plus len(times)"""
+    ticks = timescale * interval
+    bucket_count = int(times[-1] // ticks) + 1
+    return [bisect_left(times, i * ticks) for i in range(bucket_count)] + [len(times)]
+
+
+def interval_bitrates(times, prefix, timescale, interval):
+    """Sum sample sizes into fixed intervals of `interval` seconds, via prefix sums
+
+    Returns a list of (start_time, samples, bytes, bitrate_bps), one per
+    interval from 0 to the last sample, including empty intervals.
+    """
+    if not times:
+        return []
+    bounds = interval_bounds(times, timescale, interval)
+    return [(i * interval, bounds[i + 1] - bounds[i], prefix[bounds[i + 1]] - prefix[bounds[i]],
+             (prefix[bounds[i + 1]] - prefix[bounds[i]]) * 8 / interval)
+            for i in range(len(bounds) - 1)]
+
+
+def window_totals(times, prefix, timescale, window):
+    """Bytes in the window of `window` seconds starting at each sample's decode time
+
+    Uses a two-pointer sweep over the prefix sums, so this is O(samples).
+    """
+    # times are integers, so t < start + window * timescale  <=>  t < start + ceil(...)
+    ticks = math.ceil(window * timescale)
+    totals = []
+    last = 0
+    count = len(times)
+    for first in range(count):
+        end = times[first] + ticks
+        while last < count and times[last] < end:
+            last += 1
+        totals.append(prefix[last] - prefix[first])
+    return totals
+
+
+def interval_peak_windows(times, totals, timescale, interval, window):
+    """Peak sliding-window bitrate of the windows starting in each interval
+
+    Returns one bitrate_bps per interval of interval_bitrates, 0 for
+    intervals without samples.
+    """
+    if not times:
+        return []
+    bounds = interval_bounds(times, timescale, interval)
+    return [max(totals[bounds[i]:bounds[i + 1]], default=0) * 8 / window for i in range(len(bounds) - 1)]
+
+
+def peak_window(times, totals, timescale, window):
+    """Find the window of `window` seconds with the most bytes
+
+    Every window starting at a sample's decode time is checked, using the
+    per-sample totals from window_totals.
+
+    Returns (bitrate_bps, start_time, bytes) or None for an empty track.
+    """
+    if not times:
+        return None
+    best = max(range(len(totals)), key=totals.__getitem__)
+    return totals[best] * 8 / window, times[best] / timescale, totals[best]
+
+
+def gop_sizes(times, end_time, prefix, sync_samples, timescale):
+    """Size, frame count and bitrate of each GOP (sync sample to next sync sample)
+
+    sync_samples are the 1-based sample numbers from stss.
+    """
+    gops = []
+    starts = [number - 1 for number in sync_samples if 0 < number <= len(times)]
+    for index, first in enumerate(starts):
+        last = starts[index + 1] if index + 1 < len(starts) else len(times)
+        start_time = times[first]
+        stop_time = times[last] if last < len(times) else end_time
+        duration = (stop_time - start_time) / timescale
+        total = prefix[last] - prefix[first]
+        gops.append({
+            'gop': index + 1,
+            'first_sample': first + 1,
+            'frames': last - first,
+            'bytes': total,
+            'start_time': start_time / timescale,
+            'duration': duration,
+            'bitrate_bps': total * 8 / duration if duration > 0 else 0,
+        })
+    return gops
+
+
+def analyse_track(track, interval=1.0, window=1.0):
+    """Compute the bitrate timeline, peak window and GOP sizes of one track"""
+    tables = track['tables']
+    timescale = track['timescale']
+    if 'stsz' not in tables or 'stts' not in tables or not timescale:
+        return None
+
+    sizes = parse_stsz(tables['stsz'])
+    times, end_time = decode_times(parse_stts(tables['stts']))
+    # Trust the shorter table if stsz and stts disagree
+    count = min(len(sizes), len(times))
+    if count < len(times):
+        end_time = times[count]
+    sizes = sizes[:count]
+    times = times[:count]
+
+    prefix = list(accumulate(sizes, initial=0))
+    duration = end_time / timescale
+    total = prefix[-1]
+
+    totals = window_totals(times, prefix, timescale, window)
+    timeline = []
+    for (start, samples, size, bitrate), window_peak in zip(
+            interval_bitrates(times, prefix, timescale, interval),
+            interval_peak_windows(times, totals, timescale, interval, window)):
+        timeline.append({
+            'start_time': start,
+            'samples': samples,
+            'bytes': size,
+            'bitrate_bps': bitrate,
+            'peak_window_bitrate_bps': window_peak,
+        })
+
+    result = {
+        'track_id': track['track_id'],
+        'handler': track['handler'],
+        'timescale': timescale,
+        'samples': count,
+        'bytes': total,
+        'duration': duration,
+        'avg_bitrate_bps': total * 8 / duration if duration > 0 else 0,
+        'max_sample_size': max(sizes) if sizes else 0,
+        'peak_interval': max(timeline, key=lambda row: row['bytes']) if timeline else None,
+        'peak_window': None,
+        'timeline': timeline,
+        'gops': [],
+    }
+
+    peak = peak_window(times, totals, timescale, window)
+    if peak:
+        bitrate, start, size = peak
+        result['peak_window'] = {'bitrate_bps': bitrate, 'start_time': start,
+                                 'end_time': start + window, 'bytes': size}
+
+    if 'stss' in tables:
+        result['gops'] = gop_sizes(times, end_time, prefix, parse_stss(tables['stss']), timescale)
+
+    return result
+
+
+def analyse_file(mp4_path, interval=1.0, window=1.0):
+    """Analyse every track of an MP4 file from its sample tables only"""
+    container = extract_track_tables(mp4_path)
+    tracks = []
+    for track in container['tracks']:
+        result = analyse_track(track, interval, window)
+        if result:
+            tracks.append(result)
+    return {
+        'file': mp4_path,
+        'file_size': container['file_size'],
+        'interval': interval,
+        'window': window,
+        'tracks': tracks,
+    }
+
+
+def write_timeline_csv(analysis, output_path):
+    fieldnames = ['track_id', 'handler', 'start_time', 'samples', 'bytes', 'bitrate_bps',
+                  'peak_window_bitrate_bps']
+    with open(output_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for track in analysis['tracks']:
+            for row in track['timeline']:
+                writer.writerow({'track_id': track['track_id'], 'handler': track['handler'], **row})
+
+
+def write_gop_csv(analysis, output_path):
+    fieldnames = ['track_id', 'gop', 'first_sample', 'frames', 'bytes', 'start_time', 'duration', 'bitrate_bps']
+    with open(output_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for track in analysis['tracks']:
+            for row in track['gops']:
+                writer.writerow({'track_id': track['track_id'], **row})
+
+
+def print_summary(analysis):
+    print(f"File size: {analysis['file_size']:,} bytes")
+    for track in analysis['tracks']:
+        print(f"\nTrack {track['track_id']} ({track['handler']}):")
+        print(f"  Samples: {track['samples']:,}")
+        print(f"  Duration: {track['duration']:.3f} seconds")
+        print(f"  Total size: {track['bytes']:,} bytes")
+        print(f"  Average bitrate: {track['avg_bitrate_bps'] / 1000:,.1f} kbps")
+        print(f"  Largest sample: {track['max_sample_size']:,} bytes")
+        peak = track['peak_interval']
+        if peak:
+            print(f"  Peak {analysis['interval']:g}s interval: {peak['bitrate_bps'] / 1000:,.1f} kbps "
+                  f"at {peak['start_time']:.3f}s")
+        peak = track['peak_window']
+        if peak:
+            print(f"  Peak {analysis['window']:g}s sliding window: {peak['bitrate_bps'] / 1000:,.1f} kbps "
+                  f"at {peak['start_time']:.3f}s - {peak['end_time']:.3f}s")
+        gops = track['gops']
+        if gops:
+            largest = max(gops, key=lambda gop: gop['bytes'])
+            print(f"  GOPs: {len(gops):,}, average size {sum(gop['bytes'] for gop in gops) / len(gops):,.0f} bytes, "
+                  f"largest {largest['bytes']:,} bytes (GOP {largest['gop']} at {largest['start_time']:.3f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Bitrate and frame-size timeline from MP4 sample tables (stsz + stts)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  python bitrate_timeline.py video.mp4
+  python bitrate_timeline.py video.mp4 --window 2 --json video_bitrate.json
+  python bitrate_timeline.py video.mp4 --interval 0.5 -o timeline.csv --gop-output gops.csv
+        '''
+    )
+
+    parser.add_argument('input_file', help='MP4 file to analyse')
+    parser.add_argument('-o', '--output',
+                        help='Timeline CSV path (default: based on input filename)')
+    parser.add_argument('--gop-output',
+                        help='Per-GOP CSV path (default: based on input filename)')
+    parser.add_argument('--json',
+                        help='Also write the full analysis as JSON to this path')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Timeline interval in seconds (default: 1)')
+    parser.add_argument('--window', type=float, default=1.0,
+                        help='Sliding window length in seconds for peak bitrate (default: 1)')
+
+    args = parser.parse_args()
+
+    input_file = args.input_file
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' does not exist")
+        return 1
+    if args.interval <= 0 or args.window <= 0:
+        print("Error: --interval and --window must be positive")
+        return 1
+
+    input_name = os.path.basename(input_file)
+    output_file = args.output or f"{input_name}_bitrate.csv"
+    gop_file = args.gop_output or f"{input_name}_gops.csv"
+
+    print("=== Bitrate Timeline ===\n")
+    print(f"Input file: {input_file}")
+
+    try:
+        analysis = analyse_file(input_file, interval=args.interval, window=args.window)
+    except Exception as e:
+        print(f"Error analysing file: {e}")
+        return 1
+
+    print_summary(analysis)
+
+    try:
+        write_timeline_csv(analysis, output_file)
+        print(f"\nTimeline saved: {output_file}")
+        if any(track['gops'] for track in analysis['tracks']):
+            write_gop_csv(analysis, gop_file)
+            print(f"GOP sizes saved: {gop_file}")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as file:
+                json.dump(analysis, file, indent=2)
+            print(f"JSON saved: {args.json}")
+    except Exception as e:
+        print(f"Error writing output: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
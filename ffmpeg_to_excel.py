@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 """
 Convert FFmpeg output file to Excel spreadsheet
-Extracts specific fields from [FRAME]...[/FRAME] blocks
+Extracts specific fields from [FRAME]...[/FRAME] blocks, or reads them from
+a .framecache file written by frame_cache.py
 """
 
-import re
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
@@ -12,94 +12,37 @@ import sys
 import os
 import argparse
 
-def parse_ffmpeg_output(file_path, skip_audio=True):
+from frame_cache import DEFAULT_OVERLAP, target_fields, load_frames, select_columns, frame_rows, frame_count
+
+def parse_ffmpeg_output(file_path, skip_audio=True, segments=1, overlap=DEFAULT_OVERLAP):
     """Parse FFmpeg output file and extract frame data
     
     Args:
-        file_path: Path to the input file
+        file_path: Path to the input file (ffprobe output, .framecache file or media file)
         skip_audio: If True, skip frames with media_type=audio (default: True)
+        segments: Probe a media file as this many parallel segments (default: 1)
+        overlap: Seconds each segment reads past its end (default: 2)
     """
     
     print(f"Reading file: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        columns = load_frames(file_path, fields=target_fields, skip_audio=False,
+                              segments=segments, overlap=overlap)
     except Exception as e:
         print(f"Error reading file: {e}")
         return None
     
-    print(f"File loaded successfully. Size: {len(content)} characters")
-    
-    # Find all frame blocks
-    frame_pattern = r'\[FRAME\](.*?)\[/FRAME\]'
-    frame_blocks = re.findall(frame_pattern, content, re.DOTALL)
-    
-    print(f"Found {len(frame_blocks)} frame blocks")
-    
-    # Define the fields we want to extract
-    target_fields = [
-        'media_type',
-        'pts', 
-        'pts_time',
-        'pkt_dts',
-        'pkt_dts_time', 
-        'best_effort_timestamp',
-        'best_effort_timestamp_time',
-        'pict_type',
-        'duration',
-        'duration_time',
-        'key_frame',
-        'stream_index'
-    ]
-    
-    # Initialize data structure
-    frame_data = []
-    skipped_audio_count = 0
-    
-    for i, block in enumerate(frame_blocks):
-        if i % 1000 == 0:
-            print(f"Processing frame {i+1}/{len(frame_blocks)}")
-        
-        # Check if this is an audio frame and should be skipped
-        if skip_audio:
-            media_type_match = re.search(r'^media_type=(.*)$', block, re.MULTILINE)
-            if media_type_match and media_type_match.group(1).strip() == 'audio':
-                skipped_audio_count += 1
-                continue
-            
-        frame_info = {}
-        
-        # Extract each field from the block
-        for field in target_fields:
-            # Create regex pattern for field=value
-            pattern = rf'^{re.escape(field)}=(.*)$'
-            match = re.search(pattern, block, re.MULTILINE)
-            
-            if match:
-                value = match.group(1).strip()
-                # Convert numeric values
-                if field in ['pts', 'pkt_dts', 'best_effort_timestamp', 'duration', 'key_frame', 'stream_index']:
-                    try:
-                        frame_info[field] = int(value) if value != 'N/A' else None
-                    except ValueError:
-                        frame_info[field] = value
-                elif field in ['pts_time', 'pkt_dts_time', 'best_effort_timestamp_time', 'duration_time']:
-                    try:
-                        frame_info[field] = float(value) if value != 'N/A' else None
-                    except ValueError:
-                        frame_info[field] = value
-                else:
-                    frame_info[field] = value
-            else:
-                frame_info[field] = None
-        
-        frame_data.append(frame_info)
+    print(f"Found {frame_count(columns)} frames")
     
-    if skip_audio and skipped_audio_count > 0:
-        print(f"Skipped {skipped_audio_count} audio frames")
+    if skip_audio:
+        all_count = frame_count(columns)
+        columns = select_columns(columns, skip_audio=True)
+        skipped_audio_count = all_count - frame_count(columns)
+        if skipped_audio_count > 0:
+            print(f"Skipped {skipped_audio_count} audio frames")
     
-    return frame_data
+    return list(frame_rows(columns))
 
 def create_excel_file(frame_data, output_path):
     """Create Excel file from frame data"""
@@ -109,24 +52,9 @@ def create_excel_file(frame_data, output_path):
     # Create DataFrame
     df = pd.DataFrame(frame_data)
     
-    # Reorder columns to match the requested order
-    column_order = [
-        'media_type',
-        'pts', 
-        'pts_time',
-        'pkt_dts',
-        'pkt_dts_time', 
-        'best_effort_timestamp',
-        'best_effort_timestamp_time',
-        'pict_type',
-        'duration',
-        'duration_time',
-        'key_frame',
-        'stream_index'
-    ]
-    
-    # Only include columns that exist in the data
-    existing_columns = [col for col in column_order if col in df.columns]
+    # Reorder columns to match the requested order, including only columns
+    # that exist in the data
+    existing_columns = [col for col in target_fields if col in df.columns]
     df = df[existing_columns]
     
     # Save to Excel
@@ -186,16 +114,22 @@ def main():
 Examples:
   python ffmpeg_to_excel.py output.txt
   python ffmpeg_to_excel.py /path/to/ffmpeg_output.txt -o frames.xlsx
+  python ffmpeg_to_excel.py movie.mp4.framecache -o frames.xlsx
+  python ffmpeg_to_excel.py movie.mp4 --segments 8
         '''
     )
     
     parser.add_argument('input_file', 
-                       help='Path to the FFmpeg output file to convert')
+                       help='Path to the FFmpeg output file (or .framecache or media file) to convert')
     parser.add_argument('-o', '--output', 
                        help='Output Excel file path (default: based on input filename)')
     parser.add_argument('--include-audio', 
                        action='store_true',
                        help='Include audio frames (by default, audio frames are skipped)')
+    parser.add_argument('--segments', type=int, default=1,
+                       help='Probe a media file as this many keyframe-aligned segments in parallel (default: 1)')
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP,
+                       help='Seconds each segment reads past its end (default: 2)')
     
     args = parser.parse_args()
     
@@ -228,7 +162,8 @@ Examples:
     print(f"Skip audio frames: {not args.include_audio}\n")
     
     # Parse the FFmpeg output
-    frame_data = parse_ffmpeg_output(input_file, skip_audio=not args.include_audio)
+    frame_data = parse_ffmpeg_output(input_file, skip_audio=not args.include_audio,
+                                    segments=args.segments, overlap=args.overlap)
     
     if frame_data is None:
         print("Failed to parse input file")
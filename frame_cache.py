@@ -0,0 +1,886 @@
+#!/usr/bin/env python3
+"""
+Compact binary cache of ffprobe frame data
+Stores the target_fields of every frame as fixed-width, compressed columns
+in a single memory-mappable file, so ffmpeg_to_excel.py, pts_jump_analyzer.py
+and frame_table_diff.py can skip both ffprobe and text parsing on re-runs
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import subprocess
+import sys
+import zlib
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+
+from iframe_offset_extract import (decode_times, extract_track_tables, map_sample_offsets, parse_co64,
+                                   parse_ctts, parse_stco, parse_stsc, parse_stss, parse_stsz, parse_stts,
+                                   presentation_times)
+
+# Sentinel stored in integer columns when ffprobe reports N/A
+NA = -(2 ** 63)
+
+target_fields = [
+    'media_type',
+    'pts',
+    'pts_time',
+    'pkt_dts',
+    'pkt_dts_time',
+    'best_effort_timestamp',
+    'best_effort_timestamp_time',
+    'pict_type',
+    'duration',
+    'duration_time',
+    'key_frame',
+    'stream_index'
+]
+
+int_fields = ['pts', 'pkt_dts', 'best_effort_timestamp', 'duration', 'key_frame', 'stream_index']
+float_fields = ['pts_time', 'pkt_dts_time', 'best_effort_timestamp_time', 'duration_time']
+
+# media_type is stored as a small code, pict_type as the ASCII byte of its letter
+media_types = ['video', 'audio', 'subtitle', 'data', 'attachment']
+media_type_codes = {name: code for code, name in enumerate(media_types)}
+MEDIA_UNKNOWN = 255
+
+
+def new_columns():
+    """Return an empty frame table: one typed array per field in target_fields"""
+    columns = {}
+    for field in int_fields:
+        columns[field] = array('q')
+    for field in float_fields:
+        columns[field] = array('d')
+    columns['media_type'] = array('B')
+    columns['pict_type'] = array('B')
+    return columns
+
+
+def append_frame(columns, frame):
+    """Append one frame (dict of raw string values) to the column arrays"""
+    for field in int_fields:
+        value = frame.get(field)
+        try:
+            columns[field].append(int(value) if value not in (None, 'N/A', '') else NA)
+        except ValueError:
+            columns[field].append(NA)
+    for field in float_fields:
+        value = frame.get(field)
+        try:
+            columns[field].append(float(value) if value not in (None, 'N/A', '') else math.nan)
+        except ValueError:
+            columns[field].append(math.nan)
+    columns['media_type'].append(media_type_codes.get(frame.get('media_type'), MEDIA_UNKNOWN))
+    pict_type = frame.get('pict_type') or '?'
+    columns['pict_type'].append(ord(pict_type[0]))
+
+
+def _convert_column(field, values):
+    """Convert a list of raw string values for one field into a typed array"""
+    if field in int_fields:
+        typecode, convert, missing = 'q', int, NA
+    elif field in float_fields:
+        typecode, convert, missing = 'd', float, math.nan
+    elif field == 'media_type':
+        return array('B', [media_type_codes.get(value, MEDIA_UNKNOWN) for value in values])
+    else:
+        return array('B', [ord(value[0]) if value else ord('?') for value in values])
+
+    # Fast path: every value is a plain number
+    if 'N/A' not in values:
+        try:
+            return array(typecode, map(convert, values))
+        except ValueError:
+            pass
+
+    column = array(typecode)
+    for value in values:
+        try:
+            column.append(convert(value))
+        except ValueError:
+            column.append(missing)
+    return column
+
+
+# Every line inside a block starts after a newline, so anchor on '\n'
+# rather than using re.MULTILINE, which is several times slower
+_field_patterns = {
+    field: re.compile(rf'\n{re.escape(field)}=([^\n]*)') for field in target_fields
+}
+_frame_line_pattern = re.compile(
+    r'^(' + '|'.join(re.escape(field) for field in target_fields) + r')=(.*)$', re.MULTILINE)
+
+
+def _parse_blocks(blocks):
+    """Parse frame blocks that share one media type into column arrays
+
+    ffprobe prints the same set of fields for every frame of a media type,
+    so each field can be pulled out of the joined blocks with a single
+    regex pass. If a field count does not line up with the number of
+    blocks, fall back to parsing block by block.
+    """
+    text = ''.join(blocks)
+    columns = {}
+    for field in target_fields:
+        values = _field_patterns[field].findall(text)
+        if len(values) != len(blocks):
+            if values:
+                break
+            values = [''] * len(blocks)
+        columns[field] = _convert_column(field, values)
+    else:
+        return columns
+
+    columns = new_columns()
+    for block in blocks:
+        frame = {}
+        for key, value in _frame_line_pattern.findall(block):
+            frame.setdefault(key, value.strip())
+        append_frame(columns, frame)
+    return columns
+
+
+def parse_frame_text(content, skip_audio=True):
+    """Parse ffprobe -show_frames text output into column arrays
+
+    Args:
+        content: The ffprobe output as a string
+        skip_audio: If True, skip frames with media_type=audio (default: True)
+    """
+    # Group frame blocks by media type, remembering the original frame order
+    groups = {}
+    order = []
+    for block in content.split('[FRAME]')[1:]:
+        block, end, _ = block.partition('[/FRAME]')
+        if not end:
+            continue  # truncated frame at the end of the dump
+        for media_type in media_types:
+            if f'media_type={media_type}\n' in block:
+                break
+        else:
+            media_type = None
+        if skip_audio and media_type == 'audio':
+            continue
+        group = groups.setdefault(media_type, [])
+        order.append((media_type, len(group)))
+        group.append(block)
+
+    parsed = {media_type: _parse_blocks(blocks) for media_type, blocks in groups.items()}
+    if len(parsed) == 0:
+        return new_columns()
+    if len(parsed) == 1:
+        return next(iter(parsed.values()))
+
+    columns = new_columns()
+    for field, column in columns.items():
+        column.extend(parsed[media_type][field][index] for media_type, index in order)
+    return columns
+
+
+def parse_frame_dump(file_path, skip_audio=True):
+    """Parse an ffprobe -show_frames text dump file into column arrays"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        return parse_frame_text(file.read(), skip_audio)
+
+
+def probe_frames(media_path, ffprobe='ffprobe', read_intervals=None):
+    """Run ffprobe on a media file and return its frame table as column arrays
+
+    Only the target_fields are requested from ffprobe, which keeps its
+    output a fraction of the size of a full -show_frames dump.
+
+    Args:
+        media_path: Media file to probe
+        ffprobe: ffprobe executable
+        read_intervals: Optional ffprobe -read_intervals value, e.g. '60%120'
+    """
+    command = [ffprobe, '-hide_banner', '-loglevel', 'error',
+               '-show_entries', 'frame=' + ','.join(target_fields)]
+    if read_intervals:
+        command += ['-read_intervals', read_intervals]
+    command.append(media_path)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {result.stderr.strip()}")
+    return parse_frame_text(result.stdout, skip_audio=False)
+
+
+def keyframe_times(media_path):
+    """Presentation times in seconds of the video sync samples, from the MP4 keyframe index
+
+    Times are relative to the first presented frame of the track, which is
+    where ffprobe's timeline starts once the edit list is applied. Returns
+    an empty list if the file has no usable keyframe index.
+    """
+    try:
+        container = extract_track_tables(media_path)
+    except (OSError, ValueError):
+        return []
+
+    for track in container['tracks']:
+        tables = track['tables']
+        timescale = track['timescale']
+        if track['handler'] != 'vide' or not timescale or 'stss' not in tables or 'stts' not in tables:
+            continue
+        times, _ = decode_times(parse_stts(tables['stts']))
+        if 'ctts' in tables:
+            times = presentation_times(times, parse_ctts(tables['ctts']))
+        if not times:
+            continue
+        start = min(times)
+        return sorted((times[number - 1] - start) / timescale
+                      for number in parse_stss(tables['stss']) if 0 < number <= len(times))
+    return []
+
+
+def split_points(keyframes, segments):
+    """Pick up to segments - 1 keyframe times that cut the file into roughly equal parts"""
+    points = []
+    if segments < 2 or len(keyframes) < 2:
+        return points
+    end = keyframes[-1]
+    for k in range(1, segments):
+        target = end * k / segments
+        i = bisect_left(keyframes, target)
+        point = min(keyframes[max(i - 1, 0):i + 1], key=lambda time: abs(time - target))
+        if point > 0 and (not points or point > points[-1]):
+            points.append(point)
+    return points
+
+
+# The mov demuxer reads the sample stored first in the file, unless it is
+# more than this many seconds of decode time ahead of another track's next sample
+DEMUX_INTERLEAVE = 1.0
+
+
+def required_overlap(media_path, points, window=10.0):
+    """Seconds each segment must read past its split point so no video frame before it is cut off
+
+    ffprobe stops a -read_intervals segment at the first packet of any
+    stream whose pts is at or past the end. A video frame before the split
+    point is therefore only reached if no packet read before it is more
+    than the overlap past the point. Reference frames stored ahead of their
+    B-frames, and audio interleaved ahead of the video, both add to this.
+    The demuxer's read order is replayed from the MP4 sample tables for
+    `window` seconds around each split point. Returns 0.0 if the file has no
+    usable index.
+    """
+    try:
+        container = extract_track_tables(media_path)
+    except (OSError, ValueError):
+        return 0.0
+
+    tracks = []
+    for track in container['tracks']:
+        tables = track['tables']
+        timescale = track['timescale']
+        if (not timescale or 'stts' not in tables or 'stsz' not in tables or 'stsc' not in tables
+                or not ('stco' in tables or 'co64' in tables)):
+            continue
+        decode, _ = decode_times(parse_stts(tables['stts']))
+        times = presentation_times(decode, parse_ctts(tables['ctts'])) if 'ctts' in tables else decode
+        chunk_offsets = parse_stco(tables['stco']) if 'stco' in tables else parse_co64(tables['co64'])
+        offsets = map_sample_offsets(parse_stsc(tables['stsc']), chunk_offsets, parse_stsz(tables['stsz']))
+        count = min(len(times), len(offsets))
+        if count:
+            # Timestamps start at the first presented sample, as in keyframe_times
+            tracks.append((offsets, decode, times, timescale, min(times), count, track['handler'] == 'vide'))
+
+    required = 0.0
+    for point in points:
+        # Samples of each track decoded within `window` seconds of the point, in seconds
+        heads = []
+        for offsets, decode, times, timescale, start, count, video in tracks:
+            first = bisect_left(decode, point * timescale + start - window * timescale, 0, count)
+            last = bisect_left(decode, point * timescale + start + window * timescale, 0, count)
+            heads.append([0, last - first, offsets[first:last],
+                          [(time - start) / timescale for time in decode[first:last]],
+                          [(time - start) / timescale for time in times[first:last]], video])
+
+        # Replay the read order: the next sample stored first in the file, unless
+        # it is too far ahead in decode time of another track's next sample
+        latest = -math.inf
+        pending = [head for head in heads if head[0] < head[1]]
+        while pending:
+            best = pending[0]
+            for head in pending[1:]:
+                dts = head[3][head[0]]
+                best_dts = best[3][best[0]]
+                if abs(dts - best_dts) <= DEMUX_INTERLEAVE:
+                    if head[2][head[0]] < best[2][best[0]]:
+                        best = head
+                elif dts < best_dts:
+                    best = head
+            time = best[4][best[0]]
+            if best[5] and time < point and latest - point > required:
+                required = latest - point
+            if time > latest:
+                latest = time
+            best[0] += 1
+            if best[0] == best[1]:
+                pending.remove(best)
+    return required
+
+
+def merge_segments(parts, points):
+    """Merge per-segment frame tables into one ordered, de-duplicated table
+
+    Segments overlap, so frames near a boundary can be emitted twice. Frames
+    are keyed by (stream_index, pts), falling back to best_effort_timestamp.
+    Each frame belongs to the segment whose time range contains it, and the
+    copy emitted by that segment is kept when there is one; otherwise the
+    first copy is. Kept frames are grouped by owning segment in the order
+    they were emitted. Where a group holds frames of one stream from more
+    than one segment (a segment stopped between a reference frame and the
+    B-frames after it, and the next segment emitted those), that stream's
+    frames in the group are put back in timestamp order.
+    """
+    columns = new_columns()
+    sources = []
+    for segment, part in enumerate(parts):
+        for field, column in columns.items():
+            column.extend(part[field])
+        sources.extend([segment] * frame_count(part))
+
+    pts = columns['pts']
+    best_effort = columns['best_effort_timestamp']
+    streams = columns['stream_index']
+    pts_times = columns['pts_time']
+    best_effort_times = columns['best_effort_timestamp_time']
+
+    timestamps = array('q')
+    owners = []
+    chosen = {}
+    for i, source in enumerate(sources):
+        timestamp = pts[i] if pts[i] != NA else best_effort[i]
+        time = pts_times[i] if not math.isnan(pts_times[i]) else best_effort_times[i]
+        owner = source if math.isnan(time) else bisect_right(points, time)
+        timestamps.append(timestamp)
+        owners.append(owner)
+        if timestamp != NA:
+            key = (streams[i], timestamp)
+            current = chosen.get(key)
+            if current is None or (source == owner and sources[current] != owner):
+                chosen[key] = i
+
+    groups = {}
+    for i, owner in enumerate(owners):
+        if timestamps[i] == NA or chosen[(streams[i], timestamps[i])] == i:
+            groups.setdefault(owner, []).append(i)
+
+    order = []
+    for owner in sorted(groups):
+        group = groups[owner]
+        positions = {}
+        for position, i in enumerate(group):
+            if timestamps[i] != NA:
+                positions.setdefault(streams[i], []).append(position)
+        for stream_positions in positions.values():
+            frames = [group[position] for position in stream_positions]
+            if len({sources[i] for i in frames}) > 1:
+                frames.sort(key=timestamps.__getitem__)
+                for position, i in zip(stream_positions, frames):
+                    group[position] = i
+        order.extend(group)
+
+    return {field: array(_typecode(column), map(column.__getitem__, order))
+            for field, column in columns.items()}
+
+
+# Seconds each segment reads past its end by default, and the extra seconds
+# read past required_overlap when that is not enough
+DEFAULT_OVERLAP = 2.0
+OVERLAP_MARGIN = 1.0
+
+
+def probe_frames_parallel(media_path, segments, ffprobe='ffprobe', workers=None, overlap=DEFAULT_OVERLAP):
+    """Probe a long file as keyframe-aligned segments in parallel and merge the frames
+
+    The file is cut at keyframes from the MP4 keyframe index (stss) and each
+    segment is probed with -read_intervals in its own process. Each segment
+    reads `overlap` seconds past its end so no frame is lost at a boundary;
+    merge_segments drops the duplicates. If the overlap is shorter than
+    required_overlap() for the file, a warning is printed and the overlap is
+    widened. Falls back to a single ffprobe run if the file has no keyframe
+    index.
+    """
+    points = split_points(keyframe_times(media_path), segments)
+    if not points:
+        return probe_frames(media_path, ffprobe)
+
+    required = required_overlap(media_path, points)
+    if overlap < required:
+        widened = required + OVERLAP_MARGIN
+        print(f"Warning: overlap of {overlap:g}s is shorter than the {required:.3f}s that packets in this file "
+              f"are read ahead of the video; using {widened:.3f}s")
+        overlap = widened
+
+    bounds = [None] + points + [None]
+    intervals = []
+    for start, end in zip(bounds, bounds[1:]):
+        interval = ('' if start is None else f'{start:.6f}') + '%'
+        if end is not None:
+            interval += f'{end + overlap:.6f}'
+        intervals.append(interval)
+
+    print(f"Probing {len(intervals)} segments in parallel (split at {', '.join(f'{point:.3f}s' for point in points)})")
+    with ProcessPoolExecutor(max_workers=workers or len(intervals)) as executor:
+        parts = list(executor.map(probe_frames, repeat(media_path), repeat(ffprobe), intervals))
+    return merge_segments(parts, points)
+
+
+def frame_count(columns):
+    """Number of frames in a column table"""
+    for column in columns.values():
+        return len(column)
+    return 0
+
+
+def frame_rows(columns):
+    """Yield one dict per frame, with N/A values as None like ffmpeg_to_excel.py
+
+    pict_type is returned as ffprobe printed it, including '?' for audio.
+    """
+    converters = {}
+    for field in columns:
+        if field in int_fields:
+            converters[field] = lambda value: None if value == NA else value
+        elif field in float_fields:
+            converters[field] = lambda value: None if math.isnan(value) else value
+        elif field == 'media_type':
+            converters[field] = lambda value: media_types[value] if value < len(media_types) else None
+        else:
+            converters[field] = chr
+    fields = list(columns)
+    for values in zip(*columns.values()):
+        yield {field: converters[field](value) for field, value in zip(fields, values)}
+
+
+def _typecode(column):
+    """Typecode of an array, or format of a memoryview cast from the cache"""
+    return getattr(column, 'typecode', None) or column.format
+
+
+_not_audio = bytes(0 if code == media_type_codes['audio'] else 1 for code in range(256))
+
+
+def select_columns(columns, fields=None, skip_audio=True):
+    """Keep only the requested fields, dropping audio frames if skip_audio is set"""
+    media = columns.get('media_type')
+    if fields:
+        columns = {field: columns[field] for field in fields if field in columns}
+    if skip_audio and media is not None:
+        mask = bytes(media).translate(_not_audio)
+        if 0 in mask:
+            columns = {field: array(_typecode(column), compress(column, mask))
+                       for field, column in columns.items()}
+    return columns
+
+
+# --- Cache file format -------------------------------------------------------
+#
+# header:  magic, version, reserved, frame count, source size, source mtime_ns,
+#          column count, source path length
+# columns: one directory entry per column (name, typecode, codec, offset,
+#          stored size, raw size), then the source path (absolute, 0 bytes in
+#          caches written before it was recorded), then the column data, each
+#          column starting on an 8-byte boundary
+#
+# Compressed columns are byte-shuffled (all first bytes, then all second
+# bytes, ...) before zlib, which turns slowly changing timestamps into long
+# runs that compress far better than the raw little-endian values. Columns
+# written with --level 0 are stored raw and read as zero-copy views of the
+# memory-mapped file.
+
+CACHE_MAGIC = b'FRMCACHE'
+CACHE_VERSION = 1
+CACHE_EXTENSION = '.framecache'
+
+CODEC_RAW = 0
+CODEC_SHUFFLE_ZLIB = 1
+
+_header = struct.Struct('<8sHHQQqII')
+_column_entry = struct.Struct('<32scB6xQQQ')
+
+
+def _shuffle(raw, itemsize):
+    return b''.join(raw[k::itemsize] for k in range(itemsize))
+
+
+def _unshuffle(data, itemsize):
+    count = len(data) // itemsize
+    raw = bytearray(len(data))
+    for k in range(itemsize):
+        raw[k::itemsize] = data[k * count:(k + 1) * count]
+    return raw
+
+
+def write_frame_cache(columns, cache_path, source_path=None, level=6):
+    """Write column arrays to a frame cache file
+
+    Args:
+        columns: Frame table as returned by parse_frame_dump/probe_frames
+        cache_path: Path of the cache file to write
+        source_path: File the cache was built from; its path, size and mtime
+            are recorded so stale or foreign caches can be detected
+        level: zlib compression level, 0 stores the columns uncompressed
+    """
+    if source_path:
+        stat = os.stat(source_path)
+        source_size, source_mtime_ns = stat.st_size, stat.st_mtime_ns
+        source_name = os.fsencode(os.path.realpath(source_path))
+    else:
+        source_size, source_mtime_ns = 0, 0
+        source_name = b''
+
+    entries = []
+    blobs = []
+    offset = _header.size + _column_entry.size * len(columns) + len(source_name)
+    for field, column in columns.items():
+        typecode = _typecode(column)
+        raw = column.tobytes()
+        if level > 0:
+            codec = CODEC_SHUFFLE_ZLIB
+            blob = zlib.compress(_shuffle(raw, column.itemsize), level)
+        else:
+            codec = CODEC_RAW
+            blob = raw
+        offset = (offset + 7) & ~7
+        entries.append(_column_entry.pack(field.encode('ascii'), typecode.encode('ascii'),
+                                          codec, offset, len(blob), len(raw)))
+        blobs.append((offset, blob))
+        offset += len(blob)
+
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(_header.pack(CACHE_MAGIC, CACHE_VERSION, 0, frame_count(columns),
+                                source_size, source_mtime_ns, len(columns), len(source_name)))
+        for entry in entries:
+            file.write(entry)
+        file.write(source_name)
+        for blob_offset, blob in blobs:
+            file.write(b'\0' * (blob_offset - file.tell()))
+            file.write(blob)
+    os.replace(temp_path, cache_path)
+
+
+def read_cache_header(data):
+    """Parse the header of a frame cache
+
+    Returns (frame_count, source_path, source_size, source_mtime_ns, entries)
+    where source_path is '' if the cache does not record it and entries maps
+    each field to (typecode, codec, offset, stored_size, raw_size).
+    """
+    if len(data) < _header.size:
+        raise ValueError("Not a frame cache file (too short)")
+    magic, version, _, count, source_size, source_mtime_ns, column_count, name_size = _header.unpack_from(data)
+    if magic != CACHE_MAGIC:
+        raise ValueError("Not a frame cache file")
+    if version != CACHE_VERSION:
+        raise ValueError(f"Unsupported frame cache version {version}")
+
+    entries = {}
+    for i in range(column_count):
+        name, typecode, codec, offset, stored_size, raw_size = _column_entry.unpack_from(
+            data, _header.size + i * _column_entry.size)
+        entries[name.rstrip(b'\0').decode('ascii')] = (
+            typecode.decode('ascii'), codec, offset, stored_size, raw_size)
+    name_offset = _header.size + column_count * _column_entry.size
+    source_path = os.fsdecode(bytes(data[name_offset:name_offset + name_size]))
+    return count, source_path, source_size, source_mtime_ns, entries
+
+
+def read_frame_cache(cache_path, fields=None, skip_audio=True):
+    """Read column arrays from a frame cache file
+
+    The file is memory-mapped and only the requested fields (plus
+    media_type when audio has to be filtered out) are decompressed.
+
+    Args:
+        cache_path: Path to the .framecache file
+        fields: Fields to load (default: all fields in the cache)
+        skip_audio: If True, skip frames with media_type=audio (default: True)
+    """
+    with open(cache_path, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    _, _, _, _, entries = read_cache_header(view)
+
+    wanted = [field for field in (fields or entries) if field in entries]
+    if skip_audio and 'media_type' not in wanted and 'media_type' in entries:
+        wanted.append('media_type')
+
+    columns = {}
+    zero_copy = False
+    for field in wanted:
+        typecode, codec, offset, stored_size, raw_size = entries[field]
+        data = view[offset:offset + stored_size]
+        if codec == CODEC_RAW:
+            columns[field] = data.cast(typecode)
+            zero_copy = True
+            continue
+        column = array(typecode)
+        column.frombytes(_unshuffle(zlib.decompress(data), column.itemsize))
+        data.release()
+        columns[field] = column
+
+    if not zero_copy:
+        view.release()
+        mm.close()
+
+    return select_columns(columns, fields, skip_audio)
+
+
+def is_frame_cache(path):
+    with open(path, 'rb') as file:
+        return file.read(len(CACHE_MAGIC)) == CACHE_MAGIC
+
+
+def is_frame_dump(path):
+    """True if path looks like ffprobe -show_frames text output"""
+    if path.lower().endswith('.txt'):
+        return True
+    with open(path, 'rb') as file:
+        return b'[FRAME]' in file.read(65536)
+
+
+def cache_source(cache_path):
+    """(source_path, source_size, source_mtime_ns) recorded in a cache, or None if it is not a readable cache"""
+    try:
+        with open(cache_path, 'rb') as file:
+            data = file.read(_header.size)
+            if len(data) < _header.size:
+                return None
+            magic, version, _, _, source_size, source_mtime_ns, column_count, name_size = _header.unpack(data)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                return None
+            file.seek(_header.size + column_count * _column_entry.size)
+            source_path = os.fsdecode(file.read(name_size))
+    except OSError:
+        return None
+    return source_path, source_size, source_mtime_ns
+
+
+def _is_dump_of(dump_path, source_path):
+    """True if dump_path is named like the gop_size_2.sh dump of source_path (movie.mp4.txt for movie.mp4)"""
+    return os.path.basename(dump_path) == os.path.basename(source_path) + '.txt'
+
+
+def cache_path_for(path):
+    """Default cache location for a media file or an ffprobe dump
+
+    A dump named like gop_size_2.sh output (movie.mp4.txt) caches to
+    movie.mp4.framecache next to it. A media file caches to
+    <basename>.framecache in the current directory, the same place
+    gop_size_2.sh writes its dump. If that cache was built from another
+    file (say orig/movie.mp4 when path is reencode/movie.mp4), a name
+    derived from the full path is used instead so the two do not keep
+    overwriting each other.
+    """
+    if path.endswith(CACHE_EXTENSION):
+        return path
+    if is_frame_dump(path):
+        root, extension = os.path.splitext(path)
+        cache_path = (root if extension.lower() == '.txt' else path) + CACHE_EXTENSION
+    else:
+        cache_path = os.path.basename(path) + CACHE_EXTENSION
+
+    recorded = cache_source(cache_path)
+    real_path = os.path.realpath(path)
+    if recorded and recorded[0] and recorded[0] != real_path and not _is_dump_of(path, recorded[0]):
+        digest = hashlib.sha1(os.fsencode(real_path)).hexdigest()[:8]
+        cache_path = cache_path[:-len(CACHE_EXTENSION)] + f'.{digest}' + CACHE_EXTENSION
+    return cache_path
+
+
+def cache_is_fresh(cache_path, source_path):
+    """True if cache_path exists and was built from source_path as it is now
+
+    A cache built from a media file also stands in for that file's
+    gop_size_2.sh dump while the media file is unchanged, so mass_gop.sh
+    caches stay valid when a tool is run on a kept dump.
+    """
+    recorded = cache_source(cache_path)
+    if recorded is None:
+        return False
+    recorded_path, source_size, source_mtime_ns = recorded
+    if recorded_path and recorded_path != os.path.realpath(source_path):
+        if not _is_dump_of(source_path, recorded_path):
+            return False
+        source_path = recorded_path
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+    return stat.st_size == source_size and stat.st_mtime_ns == source_mtime_ns
+
+
+def load_frames(path, fields=None, skip_audio=True, ffprobe='ffprobe', use_cache=True, cache_path=None,
+                segments=1, workers=None, overlap=DEFAULT_OVERLAP):
+    """Load a frame table from a frame cache, an ffprobe dump or a media file
+
+    If a fresh cache exists for path it is read instead of parsing the dump
+    or running ffprobe. Otherwise the frames are parsed/probed and, when
+    use_cache is set, written to the cache for the next run.
+
+    Args:
+        path: .framecache file, ffprobe -show_frames dump, or media file
+        fields: Fields to load (default: all of target_fields)
+        skip_audio: If True, skip frames with media_type=audio (default: True)
+        ffprobe: ffprobe executable used for media files
+        use_cache: Read and write the cache (default: True)
+        cache_path: Cache location (default: cache_path_for(path))
+        segments: Probe media files as this many parallel segments (default: 1)
+        workers: Worker processes for segmented probing (default: one per segment)
+        overlap: Seconds each segment reads past its end (default: 2, widened if
+            required_overlap() says the file needs more)
+    """
+    if is_frame_cache(path):
+        return read_frame_cache(path, fields, skip_audio)
+
+    if cache_path is None:
+        cache_path = cache_path_for(path)
+    if use_cache and cache_is_fresh(cache_path, path):
+        print(f"Using frame cache: {cache_path}")
+        return read_frame_cache(cache_path, fields, skip_audio)
+
+    if is_frame_dump(path):
+        print(f"Parsing ffprobe output: {path}")
+        columns = parse_frame_dump(path, skip_audio=False)
+    elif segments > 1:
+        print(f"Running ffprobe on: {path}")
+        columns = probe_frames_parallel(path, segments, ffprobe, workers, overlap)
+    else:
+        print(f"Running ffprobe on: {path}")
+        columns = probe_frames(path, ffprobe)
+
+    if use_cache:
+        try:
+            write_frame_cache(columns, cache_path, source_path=path)
+            print(f"Wrote frame cache: {cache_path}")
+        except OSError as e:
+            print(f"Warning: could not write frame cache {cache_path}: {e}")
+
+    return select_columns(columns, fields, skip_audio)
+
+
+def gop_stats(columns):
+    """Frame count, keyframe count, average and maximum GOP size
+
+    Counts the same way as gop_size_2.sh: only I/P/B frames are counted and
+    each I-frame closes a GOP that includes it.
+    """
+    pict_types = bytes(columns['pict_type']).translate(None, bytes(c for c in range(256) if c not in b'IPB'))
+    gops = pict_types.split(b'I')[:-1]
+    frames = len(pict_types)
+    keyframes = len(gops)
+    return {
+        'frames': frames,
+        'keyframes': keyframes,
+        'ave_gop': frames // keyframes if keyframes else 0,
+        'max_gop': max(len(gop) + 1 for gop in gops) if gops else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build or inspect a binary frame cache of ffprobe frame data',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  python frame_cache.py movie.mp4
+  python frame_cache.py movie.mp4 --segments 8
+  python frame_cache.py movie.mp4.txt --source movie.mp4
+  python frame_cache.py movie.mp4.framecache
+  python frame_cache.py movie.mp4 --check -o movie.mp4.framecache
+        '''
+    )
+
+    parser.add_argument('input_file',
+                        help='Media file, ffprobe -show_frames dump, or existing .framecache file')
+    parser.add_argument('-o', '--output',
+                        help='Cache file path (default: based on input filename)')
+    parser.add_argument('--source',
+                        help='File whose size/mtime the cache should track (default: the input file)')
+    parser.add_argument('--ffprobe', default='ffprobe',
+                        help='ffprobe executable (default: ffprobe)')
+    parser.add_argument('--segments', type=int, default=1,
+                        help='Split a media file at keyframes and probe this many segments in parallel (default: 1)')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes for --segments (default: one per segment)')
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP,
+                        help='Seconds each segment reads past its end, de-duplicated on merge; widened if '
+                             'the file needs more (default: 2)')
+    parser.add_argument('--level', type=int, default=6, choices=range(0, 10), metavar='0-9',
+                        help='zlib compression level, 0 stores raw columns (default: 6)')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild the cache even if it is up to date')
+    parser.add_argument('--check', action='store_true',
+                        help='Only check whether the cache is up to date (exit code 0 if it is)')
+
+    args = parser.parse_args()
+
+    input_file = args.input_file
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' does not exist")
+        return 1
+
+    source = args.source or input_file
+    try:
+        if is_frame_cache(input_file):
+            cache_file = input_file
+        else:
+            cache_file = args.output or cache_path_for(input_file)
+
+        if args.check:
+            fresh = cache_file == input_file or cache_is_fresh(cache_file, source)
+            print(f"{cache_file}: {'up to date' if fresh else 'missing or stale'}")
+            return 0 if fresh else 1
+
+        if cache_file != input_file and (args.force or not cache_is_fresh(cache_file, source)):
+            if is_frame_dump(input_file):
+                print(f"Parsing ffprobe output: {input_file}")
+                columns = parse_frame_dump(input_file, skip_audio=False)
+            else:
+                print(f"Running ffprobe on: {input_file}")
+                if args.segments > 1:
+                    columns = probe_frames_parallel(input_file, args.segments, args.ffprobe,
+                                                    args.workers, args.overlap)
+                else:
+                    columns = probe_frames(input_file, args.ffprobe)
+            write_frame_cache(columns, cache_file, source_path=source, level=args.level)
+            print(f"Wrote frame cache: {cache_file}")
+            input_size = os.path.getsize(input_file)
+            cache_size = os.path.getsize(cache_file)
+            if is_frame_dump(input_file) and cache_size:
+                print(f"Dump size: {input_size:,} bytes, cache size: {cache_size:,} bytes "
+                      f"({input_size / cache_size:.1f}x smaller)")
+        else:
+            print(f"Using frame cache: {cache_file}")
+
+        columns = read_frame_cache(cache_file, fields=['pict_type'], skip_audio=True)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    stats = gop_stats(columns)
+    print()
+    print(f"frame count:\t\t{stats['frames']}")
+    print(f"keyframes:\t\t{stats['keyframes']}")
+    print()
+    print(f"ave. gop size:\t{stats['ave_gop']}")
+    print(f"max. gop size:\t{stats['max_gop']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
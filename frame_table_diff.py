@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Diff the frame tables of two encodes of the same asset
+Loads both frame tables into column arrays, aligns frames by PTS with a
+merge-join and reports dropped/inserted frames, pict_type changes,
+PTS/DTS shifts and duration changes
+"""
+
+import csv
+import os
+import sys
+import argparse
+from array import array
+from collections import Counter
+
+from frame_cache import NA, target_fields, new_columns, append_frame, load_frames, frame_count
+
+
+def parse_frame_rows(rows, skip_audio=True):
+    """Build column arrays from rows of a spreadsheet/CSV whose first row is the header"""
+    rows = iter(rows)
+    header = [str(name) if name is not None else '' for name in next(rows, [])]
+    columns = new_columns()
+    for row in rows:
+        frame = {}
+        for name, value in zip(header, row):
+            if name in target_fields and value is not None:
+                frame[name] = str(value)
+        if skip_audio and frame.get('media_type') == 'audio':
+            continue
+        append_frame(columns, frame)
+    return columns
+
+
+def load_frame_table(file_path, skip_audio=True):
+    """Load a frame table from a CSV, an ffmpeg_to_excel.py spreadsheet, or anything load_frames accepts"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.xlsx':
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            return parse_frame_rows(wb.active.iter_rows(values_only=True), skip_audio)
+        finally:
+            wb.close()
+    if extension == '.csv':
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            return parse_frame_rows(csv.reader(file), skip_audio)
+    return load_frames(file_path, skip_audio=skip_audio)
+
+
+def stream_order(columns):
+    """Group frame indices by stream_index, each group sorted by PTS
+
+    Frames without a PTS fall back to best_effort_timestamp; frames with
+    neither are left out of the alignment.
+    """
+    pts = columns['pts']
+    best_effort = columns['best_effort_timestamp']
+    streams = {}
+    keys = array('q', pts)
+    for i, stream in enumerate(columns['stream_index']):
+        if keys[i] == NA:
+            keys[i] = best_effort[i]
+            if keys[i] == NA:
+                continue
+        streams.setdefault(stream, []).append(i)
+
+    for stream, indices in streams.items():
+        # ffprobe usually emits frames in presentation order, so avoid the sort when possible
+        if any(keys[a] > keys[b] for a, b in zip(indices, indices[1:])):
+            indices.sort(key=keys.__getitem__)
+    return keys, streams
+
+
+def diff_frame_tables(cols_a, cols_b, tolerance=0, offset=0, auto_offset=False):
+    """Align two frame tables by PTS and collect the differences
+
+    Frames are matched per stream with a merge-join on PTS. Two frames
+    match when their PTS (after applying offset to table B) differ by at
+    most tolerance ticks.
+
+    Returns (summary, rows) where rows is a list of dicts for every
+    dropped, inserted or changed frame.
+    """
+    keys_a, streams_a = stream_order(cols_a)
+    keys_b, streams_b = stream_order(cols_b)
+
+    summary = {
+        'frames_a': frame_count(cols_a),
+        'frames_b': frame_count(cols_b),
+        'matched': 0,
+        'identical': 0,
+        'dropped': 0,
+        'inserted': 0,
+        'pict_type_changes': Counter(),
+        'pts_shifted': 0,
+        'dts_shifted': 0,
+        'duration_changed': 0,
+        'pts_shift_range': None,
+        'dts_shift_range': None,
+        'offsets': {},
+    }
+    rows = []
+
+    pict_a = cols_a['pict_type']
+    pict_b = cols_b['pict_type']
+    dts_a = cols_a['pkt_dts']
+    dts_b = cols_b['pkt_dts']
+    dur_a = cols_a['duration']
+    dur_b = cols_b['duration']
+
+    def widen(current, value):
+        if current is None:
+            return (value, value)
+        return (min(current[0], value), max(current[1], value))
+
+    def make_row(status, stream, i, j, changes=''):
+        row = {'status': status, 'stream_index': stream, 'changes': changes}
+        for suffix, cols, idx in (('a', cols_a, i), ('b', cols_b, j)):
+            row[f'frame_{suffix}'] = idx if idx is not None else ''
+            for field in ('pts', 'pkt_dts', 'duration'):
+                value = cols[field][idx] if idx is not None else NA
+                row[f'{field}_{suffix}'] = value if value != NA else ''
+            row[f'pict_type_{suffix}'] = chr(cols['pict_type'][idx]) if idx is not None else ''
+        return row
+
+    for stream in sorted(set(streams_a) | set(streams_b)):
+        order_a = streams_a.get(stream, [])
+        order_b = streams_b.get(stream, [])
+
+        stream_offset = offset
+        if auto_offset and order_a and order_b:
+            stream_offset = keys_b[order_b[0]] - keys_a[order_a[0]]
+        summary['offsets'][stream] = stream_offset
+
+        i = j = 0
+        len_a = len(order_a)
+        len_b = len(order_b)
+        while i < len_a and j < len_b:
+            ia = order_a[i]
+            ib = order_b[j]
+            delta = keys_b[ib] - stream_offset - keys_a[ia]
+            if delta < -tolerance:
+                summary['inserted'] += 1
+                rows.append(make_row('inserted', stream, None, ib))
+                j += 1
+                continue
+            if delta > tolerance:
+                summary['dropped'] += 1
+                rows.append(make_row('dropped', stream, ia, None))
+                i += 1
+                continue
+
+            summary['matched'] += 1
+            changes = []
+            if pict_a[ia] != pict_b[ib]:
+                summary['pict_type_changes'][(chr(pict_a[ia]), chr(pict_b[ib]))] += 1
+                changes.append('pict_type')
+            if delta != 0:
+                summary['pts_shifted'] += 1
+                summary['pts_shift_range'] = widen(summary['pts_shift_range'], delta)
+                changes.append('pts')
+            if dts_a[ia] != NA and dts_b[ib] != NA:
+                dts_delta = dts_b[ib] - stream_offset - dts_a[ia]
+                if dts_delta != 0:
+                    summary['dts_shifted'] += 1
+                    summary['dts_shift_range'] = widen(summary['dts_shift_range'], dts_delta)
+                    changes.append('pkt_dts')
+            elif dts_a[ia] != dts_b[ib]:
+                summary['dts_shifted'] += 1
+                changes.append('pkt_dts')
+            if dur_a[ia] != dur_b[ib]:
+                summary['duration_changed'] += 1
+                changes.append('duration')
+
+            if changes:
+                rows.append(make_row('changed', stream, ia, ib, ';'.join(changes)))
+            else:
+                summary['identical'] += 1
+            i += 1
+            j += 1
+
+        for ia in order_a[i:]:
+            summary['dropped'] += 1
+            rows.append(make_row('dropped', stream, ia, None))
+        for ib in order_b[j:]:
+            summary['inserted'] += 1
+            rows.append(make_row('inserted', stream, None, ib))
+
+    return summary, rows
+
+
+def write_diff_csv(rows, output_path):
+    """Write the differing rows to a CSV file"""
+    fieldnames = ['status', 'stream_index', 'changes']
+    for suffix in ('a', 'b'):
+        fieldnames += [f'frame_{suffix}', f'pts_{suffix}', f'pkt_dts_{suffix}',
+                       f'duration_{suffix}', f'pict_type_{suffix}']
+    with open(output_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_summary(summary):
+    print("\nSummary:")
+    print(f"Frames in A: {summary['frames_a']:,}")
+    print(f"Frames in B: {summary['frames_b']:,}")
+    print(f"Matched by PTS: {summary['matched']:,} ({summary['identical']:,} identical)")
+    print(f"Dropped (only in A): {summary['dropped']:,}")
+    print(f"Inserted (only in B): {summary['inserted']:,}")
+
+    offsets = {stream: value for stream, value in summary['offsets'].items() if value}
+    if offsets:
+        print("PTS offset applied to B: " + ", ".join(f"stream {s}: {v}" for s, v in offsets.items()))
+
+    changes = summary['pict_type_changes']
+    print(f"pict_type changes: {sum(changes.values()):,}")
+    for (before, after), count in changes.most_common():
+        print(f"  {before} -> {after}: {count:,}")
+
+    print(f"PTS shifts: {summary['pts_shifted']:,}", end='')
+    if summary['pts_shift_range']:
+        print(f" (range {summary['pts_shift_range'][0]} to {summary['pts_shift_range'][1]})", end='')
+    print()
+    print(f"DTS shifts: {summary['dts_shifted']:,}", end='')
+    if summary['dts_shift_range']:
+        print(f" (range {summary['dts_shift_range'][0]} to {summary['dts_shift_range'][1]})", end='')
+    print()
+    print(f"Duration changes: {summary['duration_changed']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Diff the frame tables of two encodes of the same asset',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Inputs can be .framecache files, ffprobe -show_frames dumps, media files,
+CSV files or spreadsheets created by ffmpeg_to_excel.py.
+
+Examples:
+  python frame_table_diff.py original.mp4.txt reencode.mp4.txt
+  python frame_table_diff.py a_frames.xlsx b_frames.xlsx -o diff.csv
+  python frame_table_diff.py a.txt b.txt --auto-offset --tolerance 1
+        '''
+    )
+
+    parser.add_argument('file_a', help='Frame table of the reference encode')
+    parser.add_argument('file_b', help='Frame table of the encode to compare')
+    parser.add_argument('-o', '--output',
+                        help='Output CSV of differing rows (default: based on input filenames)')
+    parser.add_argument('--tolerance', type=int, default=0,
+                        help='Maximum PTS difference in ticks for two frames to match (default: 0)')
+    parser.add_argument('--offset', type=int, default=0,
+                        help='PTS offset in ticks to subtract from B before matching (default: 0)')
+    parser.add_argument('--auto-offset', action='store_true',
+                        help='Use the difference between the first PTS of each stream as the offset')
+    parser.add_argument('--include-audio', action='store_true',
+                        help='Include audio frames (by default, audio frames are skipped)')
+
+    args = parser.parse_args()
+
+    for input_file in (args.file_a, args.file_b):
+        if not os.path.exists(input_file):
+            print(f"Error: Input file '{input_file}' does not exist")
+            return 1
+
+    if args.output:
+        output_file = args.output
+    else:
+        name_a = os.path.splitext(os.path.basename(args.file_a))[0]
+        name_b = os.path.splitext(os.path.basename(args.file_b))[0]
+        output_file = f"{name_a}_vs_{name_b}_diff.csv"
+
+    print("=== Frame Table Diff ===\n")
+    print(f"A: {args.file_a}")
+    print(f"B: {args.file_b}")
+    print(f"Output file: {output_file}\n")
+
+    try:
+        cols_a = load_frame_table(args.file_a, skip_audio=not args.include_audio)
+        print(f"Loaded {frame_count(cols_a):,} frames from A")
+        cols_b = load_frame_table(args.file_b, skip_audio=not args.include_audio)
+        print(f"Loaded {frame_count(cols_b):,} frames from B")
+    except Exception as e:
+        print(f"Error reading frame table: {e}")
+        return 1
+
+    summary, rows = diff_frame_tables(cols_a, cols_b, tolerance=args.tolerance,
+                                      offset=args.offset, auto_offset=args.auto_offset)
+    print_summary(summary)
+
+    try:
+        write_diff_csv(rows, output_file)
+    except Exception as e:
+        print(f"Error writing CSV file: {e}")
+        return 1
+    print(f"\nWrote {len(rows):,} differing rows to {output_file}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,33 @@
 import sys
 import traceback
 import struct
+from array import array
+from itertools import accumulate
 from pathlib import Path
 
+def read_be_uint32s(data, count):
+    """Decode count big-endian 32-bit unsigned integers from data into a list"""
+    values = array('I')
+    values.frombytes(bytes(data[:count * 4]))
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values.tolist()
+
+def read_be_uint64s(data, count):
+    """Decode count big-endian 64-bit unsigned integers from data into a list"""
+    values = array('Q')
+    values.frombytes(bytes(data[:count * 8]))
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values.tolist()
+
 def parse_stss(data):
     """Parse Sync Sample Table (stss) - returns list of I-frame sample numbers"""
     version = data[0]
     flags = int.from_bytes(data[1:4], byteorder='big')
     entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    entries = []
-    for i in range(entry_count):
-        offset = 8 + (i * 4)
-        sample_number = int.from_bytes(data[offset:offset+4], byteorder='big')
-        entries.append(sample_number)
-    
-    return entries
+    return read_be_uint32s(data[8:], entry_count)
 
 def parse_stco(data):
     """Parse Chunk Offset Table (stco) - returns list of chunk offsets"""
@@ -23,13 +35,7 @@ def parse_stco(data):
     flags = int.from_bytes(data[1:4], byteorder='big')
     entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    offsets = []
-    for i in range(entry_count):
-        offset = 8 + (i * 4)
-        chunk_offset = int.from_bytes(data[offset:offset+4], byteorder='big')
-        offsets.append(chunk_offset)
-    
-    return offsets
+    return read_be_uint32s(data[8:], entry_count)
 
 def parse_co64(data):
     """Parse 64-bit Chunk Offset Table (co64)"""
@@ -37,13 +43,7 @@ def parse_co64(data):
     flags = int.from_bytes(data[1:4], byteorder='big')
     entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    offsets = []
-    for i in range(entry_count):
-        offset = 8 + (i * 8)
-        chunk_offset = int.from_bytes(data[offset:offset+8], byteorder='big')
-        offsets.append(chunk_offset)
-    
-    return offsets
+    return read_be_uint64s(data[8:], entry_count)
 
 def parse_stsz(data):
     """Parse Sample Size Table (stsz) - returns list of sample sizes"""
@@ -57,12 +57,7 @@ def parse_stsz(data):
         return [sample_size] * sample_count
     else:
         # Each sample has its own size
-        sizes = []
-        for i in range(sample_count):
-            offset = 12 + (i * 4)
-            size = int.from_bytes(data[offset:offset+4], byteorder='big')
-            sizes.append(size)
-        return sizes
+        return read_be_uint32s(data[12:], sample_count)
 
 def parse_stsc(data):
     """Parse Sample to Chunk Table (stsc) - returns list of (first_chunk, samples_per_chunk, sample_description_index)"""
@@ -70,207 +65,280 @@ def parse_stsc(data):
     flags = int.from_bytes(data[1:4], byteorder='big')
     entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    entries = []
-    for i in range(entry_count):
-        offset = 8 + (i * 12)
-        first_chunk = int.from_bytes(data[offset:offset+4], byteorder='big')
-        samples_per_chunk = int.from_bytes(data[offset+4:offset+8], byteorder='big')
-        sample_description_index = int.from_bytes(data[offset+8:offset+12], byteorder='big')
-        entries.append((first_chunk, samples_per_chunk, sample_description_index))
+    values = read_be_uint32s(data[8:], entry_count * 3)
+    return list(zip(values[0::3], values[1::3], values[2::3]))
+
+def parse_stts(data):
+    """Parse Decoding Time to Sample Table (stts) - returns list of (sample_count, sample_delta)"""
+    version = data[0]
+    flags = int.from_bytes(data[1:4], byteorder='big')
+    entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    return entries
+    values = read_be_uint32s(data[8:], entry_count * 2)
+    return list(zip(values[0::2], values[1::2]))
 
-def extract_iframe_offsets(mp4_path):
-    offsets = []
-    all_samples = []  # Track all sample offsets and sizes for validation
-    with open(mp4_path, 'rb') as f:
-        data = f.read()
+def parse_ctts(data):
+    """Parse Composition Time to Sample Table (ctts) - returns list of (sample_count, sample_offset)"""
+    version = data[0]
+    flags = int.from_bytes(data[1:4], byteorder='big')
+    entry_count = int.from_bytes(data[4:8], byteorder='big')
     
-    file_size = len(data)
+    counts = read_be_uint32s(data[8:], entry_count * 2)[0::2]
+    # Offsets are signed in version 1, and many muxers write negative offsets in version 0 too
+    offsets = array('i')
+    offsets.frombytes(bytes(data[8:8 + entry_count * 8]))
+    if sys.byteorder == 'little':
+        offsets.byteswap()
+    return list(zip(counts, offsets[1::2]))
 
-    # Find moov box
-    pos = 0
-    moov_start = None
-    moov_size = None
+def decode_times(stts_entries):
+    """Expand stts (sample_count, sample_delta) entries into per-sample decode times
     
-    while pos < len(data):
-        if pos + 8 > len(data):
+    Returns (times, end_time) in timescale units, where end_time is the
+    decode time just past the last sample.
+    """
+    deltas = []
+    for sample_count, sample_delta in stts_entries:
+        deltas.extend([sample_delta] * sample_count)
+    times = list(accumulate(deltas, initial=0))
+    end_time = times.pop() if times else 0
+    return times, end_time
+
+def presentation_times(decode, ctts_entries):
+    """Add ctts (sample_count, sample_offset) entries to per-sample decode times - returns per-sample presentation times"""
+    offsets = []
+    for sample_count, sample_offset in ctts_entries:
+        offsets.extend([sample_offset] * sample_count)
+    return [time + offset for time, offset in zip(decode, offsets)] + decode[len(offsets):]
+
+def parse_mdhd(data):
+    """Parse Media Header (mdhd) - returns (timescale, duration)"""
+    version = data[0]
+    if version == 1:
+        timescale = int.from_bytes(data[20:24], byteorder='big')
+        duration = int.from_bytes(data[24:32], byteorder='big')
+    else:
+        timescale = int.from_bytes(data[12:16], byteorder='big')
+        duration = int.from_bytes(data[16:20], byteorder='big')
+    return timescale, duration
+
+def parse_tkhd(data):
+    """Parse Track Header (tkhd) - returns track_ID"""
+    version = data[0]
+    offset = 20 if version == 1 else 12
+    return int.from_bytes(data[offset:offset+4], byteorder='big')
+
+def parse_hdlr(data):
+    """Parse Handler Reference (hdlr) - returns handler type ('vide', 'soun', ...)"""
+    return data[8:12].decode('latin-1')
+
+def parse_stsd(data):
+    """Parse Sample Description (stsd) - returns list of (format, entry_payload) e.g. ('avc1', ...)"""
+    version = data[0]
+    flags = int.from_bytes(data[1:4], byteorder='big')
+    entry_count = int.from_bytes(data[4:8], byteorder='big')
+    
+    entries = []
+    for entry_type, payload_start, entry_end in iter_boxes(data, 8):
+        if len(entries) == entry_count:
             break
+        entries.append((entry_type.decode('latin-1'), data[payload_start:entry_end]))
+    return entries
+
+def iter_boxes(data, start=0, end=None):
+    """Yield (box_type, payload_start, box_end) for the boxes in data[start:end]"""
+    if end is None:
+        end = len(data)
+    pos = start
+    while pos + 8 <= end:
         box_size = int.from_bytes(data[pos:pos+4], byteorder='big')
-        box_type = data[pos+4:pos+8]
+        box_type = bytes(data[pos+4:pos+8])
+        header_size = 8
         
         if box_size == 0:
-            box_size = len(data) - pos
+            box_size = end - pos
         elif box_size == 1:
             box_size = int.from_bytes(data[pos+8:pos+16], byteorder='big')
+            header_size = 16
         
-        if box_type == b'moov':
-            moov_start = pos
-            moov_size = box_size
+        if box_size < header_size:
             break
         
+        yield box_type, pos + header_size, min(pos + box_size, end)
         pos += box_size
 
-    if not moov_start:
-        raise ValueError("No 'moov' box found — invalid MP4 file.")
+def find_box(data, path, start=0, end=None):
+    """Return (payload_start, box_end) of the first box matching path (e.g. [b'mdia', b'mdhd'])"""
+    for box_type, payload_start, box_end in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, box_end
+            return find_box(data, path[1:], payload_start, box_end)
+    return None
 
-    # Find mdat box for validation
-    pos = 0
-    mdat_start = None
-    mdat_end = None
+def read_top_level_boxes(f):
+    """List the top-level boxes of an open MP4 file without reading their payloads
     
-    while pos < len(data):
-        if pos + 8 > len(data):
-            break
-        box_size = int.from_bytes(data[pos:pos+4], byteorder='big')
-        box_type = data[pos+4:pos+8]
+    Returns list of (box_type, offset, size, header_size)
+    """
+    f.seek(0, 2)
+    file_size = f.tell()
+    boxes = []
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        header = f.read(16)
+        box_size = int.from_bytes(header[0:4], byteorder='big')
+        box_type = header[4:8]
+        header_size = 8
         
         if box_size == 0:
-            box_size = len(data) - pos
+            box_size = file_size - pos
         elif box_size == 1:
-            box_size = int.from_bytes(data[pos+8:pos+16], byteorder='big')
+            box_size = int.from_bytes(header[8:16], byteorder='big')
+            header_size = 16
         
-        if box_type == b'mdat':
-            mdat_start = pos + 8  # Data starts after the 8-byte header
-            mdat_end = pos + box_size
+        if box_size < header_size:
             break
         
+        boxes.append((box_type, pos, box_size, header_size))
         pos += box_size
+    return boxes
 
-    # Navigate through moov -> trak -> mdia -> minf -> stbl
-    moov_data = data[moov_start:moov_start+moov_size]
+def extract_track_tables(mp4_path):
+    """Locate the sample tables of every track by reading only the moov box
     
-    # Find all trak boxes
-    pos = 8  # Skip moov header
-    while pos < len(moov_data):
-        if pos + 8 > len(moov_data):
-            break
-        box_size = int.from_bytes(moov_data[pos:pos+4], byteorder='big')
-        box_type = moov_data[pos+4:pos+8]
+    Returns a dict with file_size, the top-level boxes (see
+    read_top_level_boxes) and a list of tracks. Each track is a dict with
+    track_id, handler, timescale, duration and 'tables', which maps stbl
+    child box types ('stsz', 'stts', 'stss', 'stco', 'co64', 'stsc', 'stsd',
+    'ctts', ...) to their payload bytes.
+    """
+    with open(mp4_path, 'rb') as f:
+        boxes = read_top_level_boxes(f)
+        file_size = f.seek(0, 2)
+        moov = next((box for box in boxes if box[0] == b'moov'), None)
+        if moov is None:
+            raise ValueError("No 'moov' box found — invalid MP4 file.")
+        f.seek(moov[1])
+        moov_data = f.read(moov[2])
+    
+    tracks = []
+    for box_type, trak_start, trak_end in iter_boxes(moov_data, moov[3]):
+        if box_type != b'trak':
+            continue
         
-        if box_size == 0:
-            box_size = len(moov_data) - pos
-        elif box_size == 1:
-            box_size = int.from_bytes(moov_data[pos+8:pos+16], byteorder='big')
+        track = {'track_id': None, 'handler': None, 'timescale': None, 'duration': None, 'tables': {}}
+        
+        tkhd = find_box(moov_data, [b'tkhd'], trak_start, trak_end)
+        if tkhd:
+            track['track_id'] = parse_tkhd(moov_data[tkhd[0]:tkhd[1]])
+        
+        mdia = find_box(moov_data, [b'mdia'], trak_start, trak_end)
+        if mdia:
+            mdhd = find_box(moov_data, [b'mdhd'], *mdia)
+            if mdhd:
+                track['timescale'], track['duration'] = parse_mdhd(moov_data[mdhd[0]:mdhd[1]])
+            hdlr = find_box(moov_data, [b'hdlr'], *mdia)
+            if hdlr:
+                track['handler'] = parse_hdlr(moov_data[hdlr[0]:hdlr[1]])
+            stbl = find_box(moov_data, [b'minf', b'stbl'], *mdia)
+            if stbl:
+                for child_type, child_start, child_end in iter_boxes(moov_data, *stbl):
+                    track['tables'][child_type.decode('latin-1')] = moov_data[child_start:child_end]
+        
+        tracks.append(track)
+    
+    return {'file_size': file_size, 'boxes': boxes, 'tracks': tracks}
+
+def map_sample_offsets(stsc_entries, chunk_offsets, sample_sizes):
+    """Map every sample to its byte offset using the stsc, stco/co64 and stsz tables - returns list of offsets (index 0 is sample 1)"""
+    # Build sample-to-chunk map
+    sample_to_chunk_map = []
+    for i, entry in enumerate(stsc_entries):
+        first_chunk = entry[0]
+        samples_per_chunk = entry[1]
         
-        if box_type == b'trak':
-            # Found a track, navigate to stbl
-            trak_data = moov_data[pos:pos+box_size]
+        if i + 1 < len(stsc_entries):
+            last_chunk = stsc_entries[i + 1][0] - 1
+        else:
+            last_chunk = len(chunk_offsets)
+        
+        for chunk_num in range(first_chunk, last_chunk + 1):
+            sample_to_chunk_map.append((chunk_num, samples_per_chunk))
+    
+    # Consecutive samples in a chunk are stored back to back
+    sample_offsets = []
+    for chunk_num, samples_per_chunk in sample_to_chunk_map:
+        sample_offset = chunk_offsets[chunk_num - 1]
+        
+        for _ in range(samples_per_chunk):
+            if len(sample_offsets) >= len(sample_sizes):
+                return sample_offsets
             
-            # Find mdia
-            trak_pos = 8
-            while trak_pos < len(trak_data):
-                if trak_pos + 8 > len(trak_data):
-                    break
-                inner_size = int.from_bytes(trak_data[trak_pos:trak_pos+4], byteorder='big')
-                inner_type = trak_data[trak_pos+4:trak_pos+8]
-                
-                if inner_type == b'mdia':
-                    mdia_data = trak_data[trak_pos:trak_pos+inner_size]
-                    
-                    # Find minf
-                    mdia_pos = 8
-                    while mdia_pos < len(mdia_data):
-                        if mdia_pos + 8 > len(mdia_data):
-                            break
-                        minf_size = int.from_bytes(mdia_data[mdia_pos:mdia_pos+4], byteorder='big')
-                        minf_type = mdia_data[mdia_pos+4:mdia_pos+8]
-                        
-                        if minf_type == b'minf':
-                            minf_data = mdia_data[mdia_pos:mdia_pos+minf_size]
-                            
-                            # Find stbl
-                            minf_pos = 8
-                            while minf_pos < len(minf_data):
-                                if minf_pos + 8 > len(minf_data):
-                                    break
-                                stbl_size = int.from_bytes(minf_data[minf_pos:minf_pos+4], byteorder='big')
-                                stbl_type = minf_data[minf_pos+4:minf_pos+8]
-                                
-                                if stbl_type == b'stbl':
-                                    stbl_data = minf_data[minf_pos:minf_pos+stbl_size]
-                                    
-                                    # Parse stbl children manually
-                                    stss_data = None
-                                    stco_data = None
-                                    co64_data = None
-                                    stsz_data = None
-                                    stsc_data = None
-                                    
-                                    stbl_pos = 8
-                                    while stbl_pos < len(stbl_data):
-                                        if stbl_pos + 8 > len(stbl_data):
-                                            break
-                                        child_size = int.from_bytes(stbl_data[stbl_pos:stbl_pos+4], byteorder='big')
-                                        child_type = stbl_data[stbl_pos+4:stbl_pos+8]
-                                        child_data = stbl_data[stbl_pos+8:stbl_pos+child_size]
-                                        
-                                        if child_type == b'stss':
-                                            stss_data = child_data
-                                        elif child_type == b'stco':
-                                            stco_data = child_data
-                                        elif child_type == b'co64':
-                                            co64_data = child_data
-                                        elif child_type == b'stsz':
-                                            stsz_data = child_data
-                                        elif child_type == b'stsc':
-                                            stsc_data = child_data
-                                        
-                                        stbl_pos += child_size
-                                    
-                                    # Process if we have all required boxes
-                                    if stss_data and (stco_data or co64_data) and stsz_data and stsc_data:
-                                        iframe_samples = set(parse_stss(stss_data))
-                                        chunk_offsets = parse_stco(stco_data) if stco_data else parse_co64(co64_data)
-                                        sample_sizes = parse_stsz(stsz_data)
-                                        stsc_entries = parse_stsc(stsc_data)
-                                        
-                                        # Build sample-to-chunk map
-                                        sample_to_chunk_map = []
-                                        for i, entry in enumerate(stsc_entries):
-                                            first_chunk = entry[0]
-                                            samples_per_chunk = entry[1]
-                                            
-                                            if i + 1 < len(stsc_entries):
-                                                last_chunk = stsc_entries[i + 1][0] - 1
-                                            else:
-                                                last_chunk = len(chunk_offsets)
-                                            
-                                            for chunk_num in range(first_chunk, last_chunk + 1):
-                                                sample_to_chunk_map.append((chunk_num, samples_per_chunk))
-                                        
-                                        # Map sample numbers to byte offsets
-                                        sample_index = 1
-                                        for chunk_num, samples_per_chunk in sample_to_chunk_map:
-                                            chunk_offset = chunk_offsets[chunk_num - 1]
-                                            sample_offset = chunk_offset
-                                            
-                                            for _ in range(samples_per_chunk):
-                                                if sample_index > len(sample_sizes):
-                                                    break
-                                                
-                                                sample_size = sample_sizes[sample_index - 1]
-                                                
-                                                # Track all samples for frame count validation
-                                                all_samples.append({
-                                                    'offset': sample_offset,
-                                                    'size': sample_size,
-                                                    'is_iframe': sample_index in iframe_samples
-                                                })
-                                                
-                                                if sample_index in iframe_samples:
-                                                    offsets.append(sample_offset)
-                                                
-                                                sample_offset += sample_size
-                                                sample_index += 1
-                                
-                                minf_pos += stbl_size
-                        
-                        mdia_pos += minf_size
-                
-                trak_pos += inner_size
+            sample_offsets.append(sample_offset)
+            sample_offset += sample_sizes[len(sample_offsets) - 1]
+    
+    return sample_offsets
+
+def map_track_samples(track):
+    """Offsets and sizes of every sample of one track from extract_track_tables
+    
+    Returns (sample_offsets, sample_sizes), or None if the track lacks the
+    sync sample, chunk offset, sample size or sample-to-chunk table.
+    """
+    tables = track['tables']
+    if not (tables.get('stss') and (tables.get('stco') or tables.get('co64'))
+            and tables.get('stsz') and tables.get('stsc')):
+        return None
+    
+    chunk_offsets = parse_stco(tables['stco']) if tables.get('stco') else parse_co64(tables['co64'])
+    sample_sizes = parse_stsz(tables['stsz'])
+    sample_offsets = map_sample_offsets(parse_stsc(tables['stsc']), chunk_offsets, sample_sizes)
+    return sample_offsets, sample_sizes
+
+def extract_sync_samples(track):
+    """Sync samples of one track from extract_track_tables - returns list of (sample_number, offset, size)"""
+    samples = map_track_samples(track)
+    if samples is None:
+        return []
+    sample_offsets, sample_sizes = samples
+    
+    return [(number, sample_offsets[number - 1], sample_sizes[number - 1])
+            for number in parse_stss(track['tables']['stss']) if 0 < number <= len(sample_offsets)]
+
+def extract_iframe_offsets(mp4_path, container=None):
+    """Find and validate the I-frame offsets of every track with a sync sample table
+    
+    container is the result of extract_track_tables(mp4_path), if the
+    caller already has it.
+    """
+    if container is None:
+        container = extract_track_tables(mp4_path)
+    file_size = container['file_size']
+
+    # Find mdat box for validation
+    mdat_start = None
+    mdat_end = None
+    for box_type, box_offset, box_size, header_size in container['boxes']:
+        if box_type == b'mdat':
+            mdat_start = box_offset + header_size  # Data starts after the box header
+            mdat_end = box_offset + box_size
+            break
+
+    offsets = []
+    all_samples = []  # (offset, size) of every sample, for validation
+    for track in container['tracks']:
+        samples = map_track_samples(track)
+        if samples is None:
+            continue
+        sample_offsets, sample_sizes = samples
+        iframe_samples = set(parse_stss(track['tables']['stss']))
         
-        pos += box_size
+        for sample_index, (sample_offset, sample_size) in enumerate(zip(sample_offsets, sample_sizes), 1):
+            all_samples.append((sample_offset, sample_size))
+            if sample_index in iframe_samples:
+                offsets.append(sample_offset)
 
     # Validate offsets
     validated_offsets = []
@@ -292,20 +360,7 @@ def extract_iframe_offsets(mp4_path):
                 reason.append(f"outside mdat box ({mdat_start}-{mdat_end})")
         
         # Check if there's enough data at offset for a valid sample
-        if offset + 4 <= file_size:
-            # Check for common NAL unit start codes (H.264/H.265)
-            # 0x00000001 or 0x000001 are common start codes
-            sample_start = data[offset:offset+4]
-            if len(sample_start) == 4:
-                # Check for 4-byte start code (0x00000001)
-                if sample_start == b'\x00\x00\x00\x01':
-                    pass  # Valid start code
-                # Check for 3-byte start code (0x000001)
-                elif sample_start[:3] == b'\x00\x00\x01':
-                    pass  # Valid start code
-                # For some MP4s, samples may not have start codes (they use length-prefixed NALs)
-                # So we'll just warn if no start code is found
-        else:
+        if offset + 4 > file_size:
             is_valid = False
             reason.append("insufficient data at offset")
         
@@ -319,10 +374,10 @@ def extract_iframe_offsets(mp4_path):
     frames_outside_mdat = 0
     total_size_from_moov = 0
     
-    for sample in all_samples:
-        total_size_from_moov += sample['size']
+    for sample_offset, sample_size in all_samples:
+        total_size_from_moov += sample_size
         if mdat_start is not None and mdat_end is not None:
-            if sample['offset'] < mdat_start or sample['offset'] + sample['size'] > mdat_end:
+            if sample_offset < mdat_start or sample_offset + sample_size > mdat_end:
                 frames_outside_mdat += 1
     
     # Calculate actual mdat size
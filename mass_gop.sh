@@ -3,6 +3,10 @@
 # mass_gop.sh - Process multiple media files with gop_size_2.sh and ffmpeg_to_excel.py
 # Usage: mass_gop.sh <input_dir> <output_dir>
 # Example: mass_gop.sh ~/input/ ~/output/
+#
+# Frame data is kept in ${BASENAME}.framecache (see frame_cache.py). Files that
+# have not changed since the last run skip ffprobe entirely. The ffprobe text
+# dump is deleted once the cache is written; set KEEP_TXT=1 to keep it.
 
 # Check if correct number of arguments provided
 if [ $# -ne 2 ]; then
@@ -55,35 +59,62 @@ for INPUT_FILE in "$INPUT_DIR"/*; do
     # Change to output directory to run gop_size_2.sh
     cd "$OUTPUT_DIR" || { echo "Error: Cannot access output directory"; exit 1; }
     
-    # Run gop_size_2.sh on the input file
-    echo "Running gop_size_2.sh..."
-    "$SCRIPT_DIR/gop_size_2.sh" "$INPUT_FILE"
-    GOP_EXIT_CODE=$?
+    # Reuse the frame cache from a previous run if the input file is unchanged
+    CACHE_FILE="${BASENAME}.framecache"
     
-    if [ $GOP_EXIT_CODE -ne 0 ]; then
-        echo "Error: gop_size_2.sh failed for $BASENAME"
-        FAILED=$((FAILED + 1))
-        continue
-    fi
-    
-    # The output file should be named ${BASENAME}.txt in current directory
-    TXT_FILE="${BASENAME}.txt"
-    
-    if [ ! -f "$TXT_FILE" ]; then
-        echo "Error: Expected output file $TXT_FILE not found"
-        FAILED=$((FAILED + 1))
-        continue
+    if python3 "$SCRIPT_DIR/frame_cache.py" --check "$INPUT_FILE" -o "$CACHE_FILE" > /dev/null; then
+        echo "Using cached frame data: $CACHE_FILE"
+        python3 "$SCRIPT_DIR/frame_cache.py" "$CACHE_FILE"
+    else
+        # Run gop_size_2.sh on the input file
+        echo "Running gop_size_2.sh..."
+        "$SCRIPT_DIR/gop_size_2.sh" "$INPUT_FILE"
+        GOP_EXIT_CODE=$?
+        
+        if [ $GOP_EXIT_CODE -ne 0 ]; then
+            echo "Error: gop_size_2.sh failed for $BASENAME"
+            FAILED=$((FAILED + 1))
+            continue
+        fi
+        
+        # The output file should be named ${BASENAME}.txt in current directory
+        TXT_FILE="${BASENAME}.txt"
+        
+        if [ ! -f "$TXT_FILE" ]; then
+            echo "Error: Expected output file $TXT_FILE not found"
+            FAILED=$((FAILED + 1))
+            continue
+        fi
+        
+        echo "Created: $TXT_FILE"
+        
+        # Convert the text dump to a compact binary frame cache
+        echo "Running frame_cache.py..."
+        python3 "$SCRIPT_DIR/frame_cache.py" "$TXT_FILE" --source "$INPUT_FILE" -o "$CACHE_FILE"
+        CACHE_EXIT_CODE=$?
+        
+        if [ $CACHE_EXIT_CODE -ne 0 ]; then
+            echo "Error: frame_cache.py failed for $TXT_FILE"
+            FAILED=$((FAILED + 1))
+            continue
+        fi
+        
+        echo "Created: $CACHE_FILE"
+        
+        # The cache holds everything the python tools need, so drop the
+        # multi-hundred-MB text dump unless asked to keep it
+        if [ -z "$KEEP_TXT" ]; then
+            rm -f "$TXT_FILE"
+        fi
     fi
     
-    echo "Created: $TXT_FILE"
-    
-    # Run ffmpeg_to_excel.py on the txt file
+    # Run ffmpeg_to_excel.py on the frame cache
     echo "Running ffmpeg_to_excel.py..."
-    python3 "$SCRIPT_DIR/ffmpeg_to_excel.py" "$TXT_FILE" -o "${BASENAME}_frames.xlsx"
+    python3 "$SCRIPT_DIR/ffmpeg_to_excel.py" "$CACHE_FILE" -o "${BASENAME}_frames.xlsx"
     EXCEL_EXIT_CODE=$?
     
     if [ $EXCEL_EXIT_CODE -ne 0 ]; then
-        echo "Error: ffmpeg_to_excel.py failed for $TXT_FILE"
+        echo "Error: ffmpeg_to_excel.py failed for $CACHE_FILE"
         FAILED=$((FAILED + 1))
         continue
     fi
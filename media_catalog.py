@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Incremental SQLite catalog of MP4 container summaries across a media library
+Stores tracks, durations, keyframe counts, GOP stats, moov position and the
+mdat/sample-size mismatch of every file, so library-wide audits (faststart,
+GOP, I-frame validity, mdat mismatch) become SQL queries. Rescans only
+reparse files whose size or mtime changed, using a pool of worker processes
+"""
+
+import csv
+import os
+import sqlite3
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from iframe_offset_extract import (decode_times, extract_iframe_offsets, extract_track_tables, parse_stsd,
+                                   parse_stss, parse_stsz, parse_stts)
+
+DEFAULT_DB = 'media_catalog.db'
+DEFAULT_EXTENSIONS = ['.mp4', '.m4v', '.mov', '.m4a', '.3gp']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL,
+    error TEXT,
+    duration REAL,
+    track_count INTEGER,
+    moov_offset INTEGER,
+    moov_size INTEGER,
+    mdat_offset INTEGER,
+    mdat_size INTEGER,
+    faststart INTEGER,
+    frames_in_moov INTEGER,
+    frames_outside_mdat INTEGER,
+    total_size_from_moov INTEGER,
+    size_mismatch REAL,
+    valid_iframes INTEGER,
+    invalid_iframes INTEGER
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    track_index INTEGER NOT NULL,
+    track_id INTEGER,
+    handler TEXT,
+    codec TEXT,
+    timescale INTEGER,
+    duration REAL,
+    samples INTEGER,
+    bytes INTEGER,
+    avg_bitrate REAL,
+    keyframes INTEGER,
+    gop_min INTEGER,
+    gop_avg REAL,
+    gop_max INTEGER,
+    gop_max_seconds REAL,
+    PRIMARY KEY (path, track_index)
+);
+CREATE INDEX IF NOT EXISTS tracks_handler ON tracks(handler);
+'''
+
+FILE_COLUMNS = ['path', 'size', 'mtime_ns', 'scanned_at', 'error', 'duration', 'track_count',
+                'moov_offset', 'moov_size', 'mdat_offset', 'mdat_size', 'faststart',
+                'frames_in_moov', 'frames_outside_mdat', 'total_size_from_moov', 'size_mismatch',
+                'valid_iframes', 'invalid_iframes']
+TRACK_COLUMNS = ['path', 'track_index', 'track_id', 'handler', 'codec', 'timescale', 'duration',
+                 'samples', 'bytes', 'avg_bitrate', 'keyframes', 'gop_min', 'gop_avg', 'gop_max',
+                 'gop_max_seconds']
+
+
+def open_catalog(db_path, create=True):
+    """Open the catalog database, creating its tables if create is set
+
+    Existing tables are never altered: a database whose files or tracks
+    table has other columns is rejected with a ValueError.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.execute('PRAGMA foreign_keys = ON')
+    if create:
+        for table, columns in (('files', FILE_COLUMNS), ('tracks', TRACK_COLUMNS)):
+            existing = [row[1] for row in connection.execute(f'PRAGMA table_info({table})')]
+            if existing and existing != columns:
+                connection.close()
+                raise ValueError(f"'{db_path}' has a {table} table that is not a media catalog table")
+        connection.executescript(SCHEMA)
+    return connection
+
+
+def summarise_track(track):
+    """Summary row for one track from its sample tables"""
+    tables = track['tables']
+    timescale = track['timescale'] or 0
+    summary = {
+        'track_id': track['track_id'],
+        'handler': track['handler'],
+        'codec': None,
+        'timescale': timescale,
+        'duration': track['duration'] / timescale if timescale else None,
+        'samples': None,
+        'bytes': None,
+        'avg_bitrate': None,
+        'keyframes': None,
+        'gop_min': None,
+        'gop_avg': None,
+        'gop_max': None,
+        'gop_max_seconds': None,
+    }
+
+    if 'stsd' in tables:
+        entries = parse_stsd(tables['stsd'])
+        if entries:
+            summary['codec'] = entries[0][0]
+
+    if 'stsz' in tables:
+        sizes = parse_stsz(tables['stsz'])
+        summary['samples'] = len(sizes)
+        summary['bytes'] = sum(sizes)
+        if summary['duration']:
+            summary['avg_bitrate'] = summary['bytes'] * 8 / summary['duration']
+
+    if 'stss' in tables and summary['samples']:
+        sample_count = summary['samples']
+        sync_samples = [number for number in parse_stss(tables['stss']) if 0 < number <= sample_count]
+        summary['keyframes'] = len(sync_samples)
+        if sync_samples:
+            bounds = sync_samples + [sample_count + 1]
+            gops = [bounds[i + 1] - bounds[i] for i in range(len(sync_samples))]
+            summary['gop_min'] = min(gops)
+            summary['gop_avg'] = sum(gops) / len(gops)
+            summary['gop_max'] = max(gops)
+
+            if 'stts' in tables and timescale:
+                times, end_time = decode_times(parse_stts(tables['stts']))
+                times.append(end_time)
+                if len(times) > sample_count:
+                    starts = [times[number - 1] for number in bounds]
+                    summary['gop_max_seconds'] = max(
+                        starts[i + 1] - starts[i] for i in range(len(gops))) / timescale
+
+    return summary
+
+
+def summarise_file(path):
+    """Build the catalog rows for one file
+
+    Runs in a worker process. Errors are recorded in the file row rather
+    than raised, so a broken file is not rescanned until it changes.
+    """
+    stat = os.stat(path)
+    row = {column: None for column in FILE_COLUMNS}
+    row.update(path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, scanned_at=time.time())
+    tracks = []
+
+    try:
+        container = extract_track_tables(path)
+        for box_type, offset, size, header_size in container['boxes']:
+            if box_type == b'moov' and row['moov_offset'] is None:
+                row['moov_offset'], row['moov_size'] = offset, size
+            elif box_type == b'mdat' and row['mdat_offset'] is None:
+                row['mdat_offset'], row['mdat_size'] = offset, size
+        if row['moov_offset'] is not None and row['mdat_offset'] is not None:
+            row['faststart'] = int(row['moov_offset'] < row['mdat_offset'])
+
+        # Tracks are keyed by their position in moov: track_id is missing
+        # without a tkhd and is not guaranteed to be unique in a broken file
+        for track_index, track in enumerate(container['tracks']):
+            summary = summarise_track(track)
+            summary['path'] = path
+            summary['track_index'] = track_index
+            tracks.append(summary)
+        row['track_count'] = len(tracks)
+        durations = [track['duration'] for track in tracks if track['duration']]
+        row['duration'] = max(durations) if durations else None
+
+        (validated_offsets, invalid_offsets, file_size, mdat_start, mdat_end, frames_in_moov,
+         frames_outside_mdat, total_size_from_moov, actual_mdat_size) = extract_iframe_offsets(path, container)
+        row['valid_iframes'] = len(validated_offsets)
+        row['invalid_iframes'] = len(invalid_offsets)
+        row['frames_in_moov'] = frames_in_moov
+        row['frames_outside_mdat'] = frames_outside_mdat
+        row['total_size_from_moov'] = total_size_from_moov
+        if actual_mdat_size > 0:
+            # Same measure as the size mismatch warning in iframe_offset_extract.py
+            row['size_mismatch'] = abs(total_size_from_moov - actual_mdat_size) / actual_mdat_size
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+
+    return row, tracks
+
+
+def find_media_files(root, extensions):
+    """Yield (path, size, mtime_ns) for every media file under root"""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in extensions:
+                path = os.path.abspath(os.path.join(directory, filename))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime_ns
+
+
+def store_summary(connection, row, tracks):
+    connection.execute('DELETE FROM tracks WHERE path = ?', (row['path'],))
+    connection.execute(
+        f"INSERT OR REPLACE INTO files ({', '.join(FILE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(FILE_COLUMNS))})",
+        [row[column] for column in FILE_COLUMNS])
+    connection.executemany(
+        f"INSERT OR REPLACE INTO tracks ({', '.join(TRACK_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(TRACK_COLUMNS))})",
+        [[track[column] for column in TRACK_COLUMNS] for track in tracks])
+
+
+def scan_library(connection, roots, extensions=DEFAULT_EXTENSIONS, workers=None, prune=True):
+    """Catalog every media file under roots, reparsing only new or changed files
+
+    Returns (unchanged, updated, failed, removed) counts.
+    """
+    known = {path: (size, mtime_ns) for path, size, mtime_ns
+             in connection.execute('SELECT path, size, mtime_ns FROM files')}
+
+    seen = set()
+    changed = []
+    for root in roots:
+        for path, size, mtime_ns in find_media_files(root, extensions):
+            seen.add(path)
+            if known.get(path) != (size, mtime_ns):
+                changed.append(path)
+
+    removed = 0
+    if prune:
+        prefixes = [os.path.join(os.path.abspath(root), '') for root in roots]
+        gone = [path for path in known if path not in seen and path.startswith(tuple(prefixes))]
+        with connection:
+            connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in gone])
+        removed = len(gone)
+
+    print(f"Files found: {len(seen):,} ({len(seen) - len(changed):,} unchanged, {len(changed):,} to scan)")
+
+    updated = 0
+    failed = 0
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(summarise_file, path): path for path in changed}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    row, tracks = future.result()
+                except Exception as e:
+                    # The file vanished or could not be stat'ed; try again next scan
+                    print(f"Error scanning {path}: {e}")
+                    failed += 1
+                    continue
+                try:
+                    with connection:
+                        store_summary(connection, row, tracks)
+                except sqlite3.Error as e:
+                    # Keep the file row so the broken file is not rescanned until it changes
+                    row['error'] = f"{type(e).__name__}: {e}"
+                    with connection:
+                        store_summary(connection, row, [])
+                if row['error']:
+                    print(f"Error parsing {path}: {row['error']}")
+                    failed += 1
+                else:
+                    updated += 1
+                if done % 100 == 0:
+                    print(f"Scanned {done:,}/{len(changed):,} files")
+
+    return len(seen) - len(changed), updated, failed, removed
+
+
+def run_query(connection, sql, csv_output=None):
+    """Run a SQL query against the catalog and print (or save) the result"""
+    start = time.perf_counter()
+    cursor = connection.execute(sql)
+    rows = cursor.fetchall()
+    elapsed = time.perf_counter() - start
+    header = [description[0] for description in cursor.description or []]
+
+    if csv_output:
+        with open(csv_output, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"Wrote {len(rows):,} rows to {csv_output}")
+    else:
+        if header:
+            print('\t'.join(header))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value) for value in row))
+    print(f"\n{len(rows):,} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Incremental SQLite catalog of MP4 container summaries',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  python media_catalog.py scan /media/library
+  python media_catalog.py scan /media/a /media/b --workers 8 --db library.db
+  python media_catalog.py query "SELECT path FROM files WHERE faststart = 0"
+  python media_catalog.py query "SELECT path, gop_max FROM tracks WHERE handler = 'vide' AND gop_max > 60"
+  python media_catalog.py query "SELECT path, invalid_iframes FROM files WHERE invalid_iframes > 0"
+  python media_catalog.py query "SELECT path, size_mismatch FROM files WHERE size_mismatch > 0.1"
+  python media_catalog.py query "SELECT path, error FROM files WHERE error IS NOT NULL" --csv errors.csv
+        '''
+    )
+    parser.add_argument('--db', default=DEFAULT_DB,
+                        help=f'Catalog database path (default: {DEFAULT_DB})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = subparsers.add_parser('scan', help='Add new and changed files to the catalog')
+    scan_parser.add_argument('directories', nargs='+', help='Directories to scan recursively')
+    scan_parser.add_argument('--workers', type=int,
+                             help='Number of worker processes (default: number of CPUs)')
+    scan_parser.add_argument('--extensions', default=','.join(DEFAULT_EXTENSIONS),
+                             help='Comma-separated file extensions to catalog (default: %(default)s)')
+    scan_parser.add_argument('--no-prune', action='store_true',
+                             help='Keep catalog entries for files that no longer exist')
+
+    query_parser = subparsers.add_parser('query', help='Run a SQL query against the catalog')
+    query_parser.add_argument('sql', help='SQL query (tables: files, tracks)')
+    query_parser.add_argument('--csv', help='Write the result to a CSV file instead of printing it')
+
+    args = parser.parse_args()
+
+    if args.command == 'scan':
+        for directory in args.directories:
+            if not os.path.isdir(directory):
+                print(f"Error: Directory '{directory}' does not exist")
+                return 1
+        extensions = [extension.strip().lower() for extension in args.extensions.split(',') if extension.strip()]
+        extensions = [extension if extension.startswith('.') else '.' + extension for extension in extensions]
+
+        print("=== Media Catalog Scan ===\n")
+        print(f"Catalog: {args.db}")
+        start = time.perf_counter()
+        try:
+            connection = open_catalog(args.db)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+        try:
+            unchanged, updated, failed, removed = scan_library(
+                connection, args.directories, extensions, args.workers, prune=not args.no_prune)
+        finally:
+            connection.close()
+
+        print(f"\nUnchanged: {unchanged:,}")
+        print(f"Updated: {updated:,}")
+        print(f"Failed: {failed:,}")
+        print(f"Removed: {removed:,}")
+        print(f"Elapsed: {time.perf_counter() - start:.2f} seconds")
+        return 0
+
+    if not os.path.exists(args.db):
+        print(f"Error: Catalog '{args.db}' does not exist, run a scan first")
+        return 1
+    connection = open_catalog(args.db, create=False)
+    try:
+        run_query(connection, args.sql, args.csv)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
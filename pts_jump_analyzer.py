@@ -3,45 +3,46 @@
 Simple PTS jump analyzer - shows specific PTS values where jumps occurred
 """
 
-import re
-import sys
+import argparse
+
+from frame_cache import DEFAULT_OVERLAP, media_type_codes, load_frames
 
 def main():
-    print("=== PTS Jump Analysis ===\n")
+    parser = argparse.ArgumentParser(
+        description='Show the PTS values where jumps occurred',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  python pts_jump_analyzer.py C:\\path\\to\\file.txt
+  python pts_jump_analyzer.py C:\\path\\to\\file.mp4.framecache
+  python pts_jump_analyzer.py C:\\path\\to\\file.mp4 --segments 8
+        '''
+    )
+    parser.add_argument('file_path', help='ffprobe output, .framecache file or media file')
+    parser.add_argument('--segments', type=int, default=1,
+                        help='Probe a media file as this many keyframe-aligned segments in parallel (default: 1)')
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP,
+                        help='Seconds each segment reads past its end (default: 2)')
+    args = parser.parse_args()
     
-    # Get file path from command line argument
-    if len(sys.argv) < 2:
-        print("Usage: python pts_jump_analyzer.py <file_path>")
-        print("Example: python pts_jump_analyzer.py C:\\path\\to\\file.txt")
-        return
+    print("=== PTS Jump Analysis ===\n")
     
-    file_path = sys.argv[1]
+    file_path = args.file_path
     
     print("Loading file:", file_path)
-    # Read the file content
+    # Read the frame table (uses/creates a .framecache so re-runs skip parsing)
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        columns = load_frames(file_path, fields=['media_type', 'pts'], skip_audio=True,
+                              segments=args.segments, overlap=args.overlap)
         print(f"File loaded successfully!")
     except Exception as e:
         print(f"Error reading file: {e}")
         return
     
     # Extract PTS values from video frames only
-    # Split content into frames
-    frames = content.split('[FRAME]')
-    
-    pts_values = []
-    for frame in frames:
-        if not frame.strip():
-            continue
-        
-        # Check if this is a video frame
-        if 'media_type=video' in frame:
-            # Extract PTS value from this frame
-            pts_match = re.search(r'pts=(\d+)', frame)
-            if pts_match:
-                pts_values.append(int(pts_match.group(1)))
+    video = media_type_codes['video']
+    pts_values = [pts for media_type, pts in zip(columns['media_type'], columns['pts'])
+                  if media_type == video and pts >= 0]
     
     print(f"Found {len(pts_values)} video PTS values")
     
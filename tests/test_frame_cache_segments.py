@@ -0,0 +1,225 @@
+"""
+Segmented probing (frame_cache.probe_frames_parallel) against a stub ffprobe
+
+The stub replays the packets of a synthetic MP4 the way ffprobe does with
+-read_intervals: it seeks to the keyframe at or before the start, stops at
+the first packet of any stream whose pts is at or past the end, and decodes
+video through a two-frame reorder buffer. The MP4 has IPBB GOPs and audio
+stored up to half a second ahead of the video, so a segment can stop after
+a P-frame but before the B-frames that follow it in decode order.
+"""
+
+import json
+import os
+import shutil
+import stat
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_cache  # noqa: E402
+
+VIDEO_TIMESCALE = 30000
+VIDEO_DELTA = 1001
+AUDIO_TIMESCALE = 48000
+AUDIO_DELTA = 1024
+GOP = 25
+CHUNK = 15
+
+STUB_FFPROBE = '''#!{python}
+import heapq, json, sys
+
+args = sys.argv[1:]
+path = args[-1]
+with open(path + '.packets.json') as file:
+    packets = json.load(file)
+
+first = 0
+end = None
+if '-read_intervals' in args:
+    start, stop = args[args.index('-read_intervals') + 1].split('%')
+    if start:
+        first = max(i for i, (stream, media_type, pts, dts, key, timescale) in enumerate(packets)
+                    if key and media_type == 'video' and pts / timescale <= float(start) + 1e-6)
+    if stop:
+        end = float(stop)
+
+def emit(packet):
+    stream, media_type, pts, dts, key, timescale, pict_type = packet
+    sys.stdout.write(
+        f"[FRAME]\\nmedia_type={{media_type}}\\nstream_index={{stream}}\\nkey_frame={{int(key)}}\\n"
+        f"pts={{pts}}\\npts_time={{pts / timescale:.6f}}\\npkt_dts={{dts}}\\npkt_dts_time={{dts / timescale:.6f}}\\n"
+        f"best_effort_timestamp={{pts}}\\nbest_effort_timestamp_time={{pts / timescale:.6f}}\\n"
+        f"duration=1\\nduration_time=0.000033\\npict_type={{pict_type}}\\n[/FRAME]\\n")
+
+reorder = []
+for stream, media_type, pts, dts, key, timescale in packets[first:]:
+    if end is not None and pts / timescale >= end:
+        break
+    if media_type == 'video':
+        pict_type = 'I' if key else ('B' if pts < dts + {delta} else 'P')
+        heapq.heappush(reorder, (pts, stream, media_type, pts, dts, key, timescale, pict_type))
+        if len(reorder) > 2:
+            emit(heapq.heappop(reorder)[1:])
+    else:
+        emit((stream, media_type, pts, dts, key, timescale, '?'))
+while reorder:
+    emit(heapq.heappop(reorder)[1:])
+'''
+
+
+def box(box_type, payload):
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+def full_box(box_type, payload):
+    return box(box_type, b'\x00\x00\x00\x00' + payload)
+
+
+def table(box_type, rows, row_format):
+    return full_box(box_type, struct.pack('>I', len(rows)) + b''.join(struct.pack(row_format, *row) for row in rows))
+
+
+def video_samples(count):
+    """(dts, ctts) of IPBB closed GOPs in decode order: I P3 B1 B2 P6 B4 B5 ..."""
+    samples = []
+    for number in range(count):
+        position = number % GOP
+        if position == 0:
+            display = 0
+        else:
+            group, slot = divmod(position - 1, 3)
+            display = 3 * group + 3 if slot == 0 else 3 * group + slot
+        display += number - position
+        samples.append((number * VIDEO_DELTA, (display - number + 1) * VIDEO_DELTA))
+    return samples
+
+
+def build_mp4(path, seconds=40):
+    """Write a synthetic MP4 and the packet list the stub ffprobe replays
+
+    Each chunk of video is followed by the audio of the next chunk, so the
+    audio is stored up to half a second ahead of the video after it.
+    """
+    video = video_samples(seconds * VIDEO_TIMESCALE // VIDEO_DELTA // GOP * GOP)
+    audio_count = seconds * AUDIO_TIMESCALE // AUDIO_DELTA
+    first_pts = min(dts + offset for dts, offset in video)
+    chunk_seconds = CHUNK * VIDEO_DELTA / VIDEO_TIMESCALE
+
+    def audio_chunk(index):
+        return [n for n in range(audio_count)
+                if index * chunk_seconds <= n * AUDIO_DELTA / AUDIO_TIMESCALE < (index + 1) * chunk_seconds]
+
+    ftyp = box(b'ftyp', b'isom\x00\x00\x02\x00isom')
+    layout = [('audio', audio_chunk(0))]
+    for index in range(0, len(video), CHUNK):
+        layout.append(('video', list(range(index, min(index + CHUNK, len(video))))))
+        layout.append(('audio', audio_chunk(index // CHUNK + 1)))
+    layout = [(kind, samples) for kind, samples in layout if samples]
+
+    offset = len(ftyp) + 8
+    chunk_offsets = {'video': [], 'audio': []}
+    chunk_sizes = {'video': [], 'audio': []}
+    packets = []
+    for kind, samples in layout:
+        chunk_offsets[kind].append(offset)
+        chunk_sizes[kind].append(len(samples))
+        for n in samples:
+            if kind == 'video':
+                dts, ctts = video[n]
+                packets.append([0, 'video', dts + ctts - first_pts, dts - first_pts, n % GOP == 0, VIDEO_TIMESCALE])
+            else:
+                time = n * AUDIO_DELTA
+                packets.append([1, 'audio', time, time, True, AUDIO_TIMESCALE])
+        offset += 100 * len(samples)
+    mdat = box(b'mdat', bytes(offset - len(ftyp) - 8))
+
+    def trak(track_id, handler, kind, timescale, count, children):
+        tkhd = full_box(b'tkhd', struct.pack('>III', 0, 0, track_id) + bytes(68))
+        mdhd = full_box(b'mdhd', struct.pack('>IIII', 0, 0, timescale, 0) + bytes(4))
+        hdlr = full_box(b'hdlr', bytes(4) + handler + bytes(12))
+        stbl = box(b'stbl', b''.join(children + [
+            full_box(b'stsz', struct.pack('>II', 100, count)),
+            table(b'stsc', [(i + 1, n, 1) for i, n in enumerate(chunk_sizes[kind])], '>III'),
+            table(b'stco', [(o,) for o in chunk_offsets[kind]], '>I'),
+        ]))
+        return box(b'trak', tkhd + box(b'mdia', mdhd + hdlr + box(b'minf', stbl)))
+
+    video_trak = trak(1, b'vide', 'video', VIDEO_TIMESCALE, len(video), [
+        table(b'stts', [(len(video), VIDEO_DELTA)], '>II'),
+        table(b'ctts', [(1, ctts) for dts, ctts in video], '>II'),
+        table(b'stss', [(n + 1,) for n in range(0, len(video), GOP)], '>I'),
+    ])
+    audio_trak = trak(2, b'soun', 'audio', AUDIO_TIMESCALE, audio_count, [
+        table(b'stts', [(audio_count, AUDIO_DELTA)], '>II'),
+    ])
+    with open(path, 'wb') as file:
+        file.write(ftyp + mdat + box(b'moov', video_trak + audio_trak))
+    with open(path + '.packets.json', 'w') as file:
+        json.dump(packets, file)
+    return len(video)
+
+
+def stream_frames(columns):
+    """Per-stream frame sequences, ignoring how the streams are interleaved"""
+    streams = {}
+    for frame in frame_cache.frame_rows(columns):
+        streams.setdefault(frame['stream_index'], []).append(
+            (frame['pts'], frame['pkt_dts'], frame['key_frame'], frame['pict_type']))
+    return streams
+
+
+@unittest.skipIf(os.name == 'nt', 'the stub ffprobe is run through its shebang line')
+class SegmentedProbeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.media = os.path.join(cls.directory, 'ipbb.mp4')
+        cls.video_frames = build_mp4(cls.media)
+        cls.ffprobe = os.path.join(cls.directory, 'ffprobe')
+        with open(cls.ffprobe, 'w') as file:
+            file.write(STUB_FFPROBE.format(python=sys.executable, delta=VIDEO_DELTA))
+        os.chmod(cls.ffprobe, os.stat(cls.ffprobe).st_mode | stat.S_IXUSR)
+        cls.serial = frame_cache.probe_frames(cls.media, cls.ffprobe)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_serial_stub_output(self):
+        streams = stream_frames(self.serial)
+        self.assertEqual(len(streams[0]), self.video_frames)
+        pts = [frame[0] for frame in streams[0]]
+        self.assertEqual(pts, sorted(pts))
+
+    def test_segments_match_serial_run(self):
+        expected = stream_frames(self.serial)
+        for segments, overlap in [(2, 2.0), (4, 2.0), (5, 2.0), (8, 2.0), (4, 0.5), (8, 0.5), (8, 0.0)]:
+            with self.subTest(segments=segments, overlap=overlap):
+                merged = frame_cache.probe_frames_parallel(self.media, segments, self.ffprobe, overlap=overlap)
+                self.assertEqual(frame_cache.frame_count(merged), frame_cache.frame_count(self.serial))
+                self.assertEqual(stream_frames(merged), expected)
+
+    def test_required_overlap_matches_read_order(self):
+        points = frame_cache.split_points(frame_cache.keyframe_times(self.media), 8)
+        with open(self.media + '.packets.json') as file:
+            packets = json.load(file)
+        # The stub reads in file order: find how far past each point the packets
+        # read before the last video frame ahead of that point go
+        expected = 0.0
+        for point in points:
+            latest = 0.0
+            for stream, media_type, pts, dts, key, timescale in packets:
+                if media_type == 'video' and pts / timescale < point:
+                    expected = max(expected, latest - point)
+                latest = max(latest, pts / timescale)
+        self.assertGreater(expected, 0.0)
+        self.assertAlmostEqual(frame_cache.required_overlap(self.media, points), expected, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
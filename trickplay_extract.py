@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Keyframe-only trick-play stream extractor
+Copies only the sync samples (I-frames) of the video track, located with the
+same sample tables as iframe_offset_extract.py, using coalesced offset-sorted
+range reads. Length-prefixed NAL units are rewritten as an Annex B
+elementary stream with the avcC/hvcC parameter sets in front of every
+keyframe, and a CSV timing index is written alongside it
+"""
+
+import csv
+import os
+import sys
+import argparse
+
+from iframe_offset_extract import (decode_times, extract_track_tables, extract_sync_samples, find_box,
+                                   parse_ctts, parse_stsd, parse_stts, presentation_times)
+
+START_CODE = b'\x00\x00\x00\x01'
+
+# Sample entry formats with length-prefixed NAL units
+AVC_FORMATS = {'avc1', 'avc3'}
+HEVC_FORMATS = {'hvc1', 'hev1'}
+
+# Fixed fields of a VisualSampleEntry before its child boxes
+VISUAL_SAMPLE_ENTRY_SIZE = 78
+
+
+def parse_avcc(data):
+    """Parse AVCDecoderConfigurationRecord (avcC) - returns (nal_length_size, [SPS..., PPS...])"""
+    nal_length_size = (data[4] & 0x03) + 1
+    parameter_sets = []
+    pos = 5
+    for count_mask in (0x1f, 0xff):
+        count = data[pos] & count_mask
+        pos += 1
+        for _ in range(count):
+            length = int.from_bytes(data[pos:pos+2], byteorder='big')
+            parameter_sets.append(bytes(data[pos+2:pos+2+length]))
+            pos += 2 + length
+    return nal_length_size, parameter_sets
+
+
+def parse_hvcc(data):
+    """Parse HEVCDecoderConfigurationRecord (hvcC) - returns (nal_length_size, [VPS..., SPS..., PPS..., SEI...])"""
+    nal_length_size = (data[21] & 0x03) + 1
+    parameter_sets = []
+    array_count = data[22]
+    pos = 23
+    for _ in range(array_count):
+        nal_count = int.from_bytes(data[pos+1:pos+3], byteorder='big')
+        pos += 3
+        for _ in range(nal_count):
+            length = int.from_bytes(data[pos:pos+2], byteorder='big')
+            parameter_sets.append(bytes(data[pos+2:pos+2+length]))
+            pos += 2 + length
+    return nal_length_size, parameter_sets
+
+
+def decoder_config(track):
+    """Codec, NAL length size and parameter sets from the track's first sample entry"""
+    tables = track['tables']
+    entries = parse_stsd(tables['stsd']) if 'stsd' in tables else []
+    if not entries:
+        raise ValueError(f"Track {track['track_id']} has no sample description")
+    sample_format, entry = entries[0]
+
+    if sample_format in AVC_FORMATS:
+        box = find_box(entry, [b'avcC'], VISUAL_SAMPLE_ENTRY_SIZE)
+        if box:
+            return ('h264',) + parse_avcc(entry[box[0]:box[1]])
+    elif sample_format in HEVC_FORMATS:
+        box = find_box(entry, [b'hvcC'], VISUAL_SAMPLE_ENTRY_SIZE)
+        if box:
+            return ('h265',) + parse_hvcc(entry[box[0]:box[1]])
+    raise ValueError(f"Unsupported sample entry '{sample_format}' (need avc1/avc3 with avcC or hvc1/hev1 with hvcC)")
+
+
+def to_annex_b(sample, nal_length_size):
+    """Convert a length-prefixed sample into Annex B NAL units"""
+    nals = []
+    pos = 0
+    end = len(sample)
+    while pos + nal_length_size <= end:
+        length = int.from_bytes(sample[pos:pos+nal_length_size], byteorder='big')
+        pos += nal_length_size
+        if length == 0 or pos + length > end:
+            break
+        nals.append(START_CODE)
+        nals.append(sample[pos:pos+length])
+        pos += length
+    return b''.join(nals)
+
+
+def plan_reads(samples, max_gap=0):
+    """Group (sample_number, offset, size) samples into coalesced byte-range reads
+
+    Samples are sorted by offset and neighbouring samples are merged into one
+    read when at most max_gap bytes separate them. Returns a list of
+    (start, end, [samples]).
+    """
+    reads = []
+    for sample in sorted(samples, key=lambda sample: sample[1]):
+        number, offset, size = sample
+        if reads and offset - reads[-1][1] <= max_gap:
+            reads[-1][1] = max(reads[-1][1], offset + size)
+            reads[-1][2].append(sample)
+        else:
+            reads.append([offset, offset + size, [sample]])
+    return reads
+
+
+def select_video_track(container, track_id=None):
+    for track in container['tracks']:
+        if track_id is not None:
+            if track['track_id'] == track_id:
+                return track
+        elif track['handler'] == 'vide' and 'stss' in track['tables']:
+            return track
+    if track_id is not None:
+        raise ValueError(f"Track {track_id} not found")
+    raise ValueError("No video track with a sync sample table (stss) found")
+
+
+def extract_keyframes(mp4_path, output_path, index_path, track_id=None, max_gap=0):
+    """Write the keyframes of the video track as an Annex B stream plus a CSV timing index
+
+    Returns a dict with the codec, keyframe count, bytes read from the
+    source, bytes written, source file size and number of range reads.
+    """
+    container = extract_track_tables(mp4_path)
+    track = select_video_track(container, track_id)
+    codec, nal_length_size, parameter_sets = decoder_config(track)
+    header = b''.join(START_CODE + parameter_set for parameter_set in parameter_sets)
+
+    file_size = container['file_size']
+    samples = extract_sync_samples(track)
+    valid = [sample for sample in samples if sample[1] + sample[2] <= file_size]
+    if len(valid) < len(samples):
+        print(f"Warning: skipping {len(samples) - len(valid)} keyframes that extend past the end of the file")
+    samples = valid
+    if not samples:
+        raise ValueError("No keyframes to extract")
+
+    tables = track['tables']
+    timescale = track['timescale']
+    decode = decode_times(parse_stts(tables['stts']))[0] if 'stts' in tables else []
+    times = presentation_times(decode, parse_ctts(tables['ctts'])) if 'ctts' in tables else decode
+    # pts_time is relative to the first presented frame, as in frame_cache.keyframe_times
+    first_pts = min(times) if times else 0
+
+    # Output goes in sample (decode) order; reads go in offset order. Samples
+    # read ahead of their turn wait in `pending` until they can be written.
+    order = sorted(sample[0] for sample in samples)
+    next_index = 0
+    pending = {}
+    bytes_read = 0
+    output_offset = 0
+
+    with open(mp4_path, 'rb') as source, \
+            open(output_path, 'wb') as output, \
+            open(index_path, 'w', encoding='utf-8', newline='') as index_file:
+        writer = csv.writer(index_file)
+        writer.writerow(['keyframe', 'sample_number', 'pts', 'pts_time', 'dts', 'source_offset',
+                         'source_size', 'output_offset', 'output_size'])
+
+        reads = plan_reads(samples, max_gap)
+        for start, end, group in reads:
+            source.seek(start)
+            data = source.read(end - start)
+            bytes_read += len(data)
+            for number, offset, size in group:
+                pending[number] = (offset, size, data[offset - start:offset - start + size])
+
+            while next_index < len(order) and order[next_index] in pending:
+                number = order[next_index]
+                offset, size, sample = pending.pop(number)
+                access_unit = header + to_annex_b(sample, nal_length_size)
+                output.write(access_unit)
+
+                pts = times[number - 1] if number <= len(times) else ''
+                dts = decode[number - 1] if number <= len(decode) else ''
+                pts_time = f"{(pts - first_pts) / timescale:.6f}" if pts != '' and timescale else ''
+                writer.writerow([next_index + 1, number, pts, pts_time, dts, offset, size,
+                                 output_offset, len(access_unit)])
+                output_offset += len(access_unit)
+                next_index += 1
+
+    return {
+        'codec': codec,
+        'track_id': track['track_id'],
+        'keyframes': len(order),
+        'bytes_read': bytes_read,
+        'bytes_written': output_offset,
+        'file_size': file_size,
+        'reads': len(reads),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract a keyframe-only (trick-play) elementary stream from an MP4 file',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Reads only the I-frame samples listed in the sync sample table (stss) and
+writes them as an Annex B H.264/H.265 stream, with SPS/PPS (and VPS) from
+avcC/hvcC in front of every keyframe, plus a CSV index of keyframe times.
+
+Examples:
+  python trickplay_extract.py video.mp4
+  python trickplay_extract.py video.mp4 -o trick.h264 --index trick.csv
+  python trickplay_extract.py video.mp4 --max-gap 65536
+        '''
+    )
+
+    parser.add_argument('input_file', help='MP4 file to extract keyframes from')
+    parser.add_argument('-o', '--output',
+                        help='Output elementary stream (default: <input>_keyframes.h264/.h265)')
+    parser.add_argument('--index',
+                        help='Output CSV timing index (default: <input>_keyframes.csv)')
+    parser.add_argument('--track', type=int,
+                        help='Track ID to extract (default: first video track with keyframes)')
+    parser.add_argument('--max-gap', type=int, default=0,
+                        help='Merge reads of keyframes separated by at most this many bytes (default: 0)')
+
+    args = parser.parse_args()
+
+    input_file = args.input_file
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' does not exist")
+        return 1
+
+    input_name = os.path.splitext(os.path.basename(input_file))[0]
+    index_file = args.index or f"{input_name}_keyframes.csv"
+
+    print("=== Trick-play Keyframe Extractor ===\n")
+    print(f"Input file: {input_file}")
+
+    try:
+        if args.output:
+            output_file = args.output
+        else:
+            container = extract_track_tables(input_file)
+            codec = decoder_config(select_video_track(container, args.track))[0]
+            output_file = f"{input_name}_keyframes.{codec}"
+        result = extract_keyframes(input_file, output_file, index_file, args.track, args.max_gap)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    print(f"Track: {result['track_id']} ({result['codec']})")
+    print(f"Keyframes extracted: {result['keyframes']:,}")
+    print(f"Range reads: {result['reads']:,}")
+    print(f"Bytes read: {result['bytes_read']:,} of {result['file_size']:,} "
+          f"({result['bytes_read'] / result['file_size'] * 100:.1f}% of the file)")
+    print(f"Bytes written: {result['bytes_written']:,}")
+    print(f"\nElementary stream: {output_file}")
+    print(f"Timing index: {index_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())